@@ -0,0 +1,52 @@
+from dolfin import *
+from xii import ii_assemble, ii_assemble_symbolic, ii_convert, Trace
+import numpy as np
+
+
+mesh = UnitSquareMesh(8, 8)
+bmesh = BoundaryMesh(mesh, 'exterior')
+
+V = FunctionSpace(mesh, 'CG', 1)
+Q = FunctionSpace(bmesh, 'CG', 1)
+W = [V, Q]
+
+u, p = map(TrialFunction, W)
+v, q = map(TestFunction, W)
+Tu, Tv = Trace(u, bmesh), Trace(v, bmesh)
+dxGamma = Measure('dx', domain=bmesh)
+
+kappa = Constant(1)
+f = interpolate(Expression('x[0]', degree=1), V)
+a = [[kappa*inner(grad(u), grad(v))*dx, inner(p, Tv)*dxGamma],
+     [inner(Tu, q)*dxGamma, 0]]
+L = [inner(f, v)*dx, inner(Trace(f, bmesh), q)*dxGamma]
+
+A_plan, b_plan = map(ii_assemble_symbolic, (a, L))
+A, b = A_plan.tensor, b_plan.tensor
+
+
+def footprint():
+    '''Handles and memory of the tensors of the plans'''
+    mats = [A] + A_plan.flat_blocks
+    vecs = [b] + b_plan.flat_blocks
+    return ([as_backend_type(M).mat().handle for M in mats],
+            [as_backend_type(M).mat().getInfo()['memory'] for M in mats],
+            [as_backend_type(v).vec().handle for v in vecs])
+
+A_plan.assemble()
+b_plan.assemble()
+memory = footprint()
+
+for k in (1., 2., 3.):
+    kappa.assign(k)
+    f.vector()[:] *= k
+
+    A_plan.assemble()
+    b_plan.assemble()
+    # Refilled in place
+    assert A_plan.tensor is A and b_plan.tensor is b
+    assert footprint() == memory
+
+    A0, b0 = map(ii_convert, map(ii_assemble, (a, L)))
+    assert np.linalg.norm(A.array() - A0.array(), np.inf) < 1E-12
+    assert np.linalg.norm(b.get_local() - b0.get_local(), np.inf) < 1E-12
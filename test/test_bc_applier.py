@@ -0,0 +1,51 @@
+from dolfin import *
+from xii import ii_assemble, ii_convert, apply_bc, BlockBCApplier
+from petsc4py import PETSc
+import numpy as np
+
+
+mesh = UnitSquareMesh(8, 8)
+V = VectorFunctionSpace(mesh, 'CG', 2)
+Q = FunctionSpace(mesh, 'CG', 1)
+W = [V, Q]
+
+u, p = map(TrialFunction, W)
+v, q = map(TestFunction, W)
+
+a = [[inner(grad(u), grad(v))*dx + inner(u, v)*dx, inner(p, div(v))*dx],
+     [inner(q, div(u))*dx, 0]]
+
+t = Constant(0)
+f = Expression(('t*x[1]*x[0]', 'sin(pi*(x[0]+t))'), t=0, degree=2)
+L = [inner(f, v)*dx, inner(t, q)*dx]
+
+g = Expression(('t', '2*t'), t=0, degree=0)
+bcs = [[DirichletBC(V, g, 'on_boundary')],
+       [DirichletBC(Q, Constant(3), 'near(x[0], 0)')]]
+
+applier = BlockBCApplier(ii_assemble(a), bcs)
+A = applier.A
+
+for step in range(1, 4):
+    f.t = g.t = step
+    t.assign(step)
+    applier.update_values()
+    
+    b = applier.apply(ii_assemble(L))
+    # Reference eliminates from scratch
+    A0, b0 = apply_bc(ii_assemble(a), ii_assemble(L), bcs)
+
+    assert (ii_convert(b) - ii_convert(b0)).norm('linf') < 1E-10
+    assert all(abs(as_backend_type(b[0]).vec()[dof] - value) < 1E-13
+               for dof, value in bcs[0][0].get_boundary_values().items())
+
+X, X0 = as_backend_type(ii_convert(A)).mat(), as_backend_type(ii_convert(A0)).mat()
+X.axpy(-1., X0)
+assert X.norm(PETSc.NormType.INFINITY) < 1E-10
+
+# Single block
+M = assemble(inner(u, v)*dx)
+m = assemble(inner(f, v)*dx)
+M_bc, m_bc = apply_bc(M, m, bcs[0])
+assert all(abs(m_bc[dof] - value) < 1E-13
+           for dof, value in bcs[0][0].get_boundary_values().items())
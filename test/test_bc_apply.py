@@ -0,0 +1,56 @@
+from dolfin import *
+from xii import ii_assemble, ii_convert, apply_bc
+from block import block_vec
+import numpy as np
+
+
+mesh = UnitSquareMesh(8, 8)
+V = VectorFunctionSpace(mesh, 'CG', 2)
+Q = FunctionSpace(mesh, 'CG', 1)
+W = [V, Q]
+
+u, p = map(TrialFunction, W)
+v, q = map(TestFunction, W)
+
+a = [[inner(grad(u), grad(v))*dx, inner(p, div(v))*dx],
+     [inner(q, div(u))*dx, 0]]
+
+x, y = SpatialCoordinate(mesh)
+L = [inner(as_vector((y*x**2, sin(pi*(x+y)))), v)*dx,
+     inner(x+y, q)*dx]
+
+bcs = [[DirichletBC(V, Constant((1, 2)), 'on_boundary')],
+       [DirichletBC(Q, Constant(3), 'near(x[0], 0)')]]
+
+# Reference is the monolithic elimination
+A, b = map(ii_assemble, (a, L))
+AA, bb = ii_convert(A), ii_convert(b)
+
+offsets = np.cumsum([0, V.dim()])
+rows, values = [], []
+for shift, bcs_i in zip(offsets, bcs):
+    for bc in bcs_i:
+        bc = bc.get_boundary_values()
+        rows.extend(shift + np.array(bc.keys(), dtype='int32'))
+        values.extend(bc.values())
+rows = np.array(rows, dtype='int32')
+
+AA_, bb_ = as_backend_type(AA).mat(), as_backend_type(bb).vec()
+xx = bb_.duplicate()
+xx.zeroEntries()
+xx.setValues(rows, values)
+AA_.zeroRowsColumns(rows, diag=1., x=xx, b=bb_)
+
+A_bc, b_bc = apply_bc(A, b, bcs)
+# In place
+assert b_bc is b and A_bc[0][0] is A[0][0]
+
+assert (ii_convert(b_bc) - bb).norm('linf') < 1E-10
+
+z = bb.copy()
+z.set_local(np.random.rand(z.local_size()))
+z_block = block_vec([Function(V).vector(), Function(Q).vector()])
+z_block[0].set_local(z.get_local()[:V.dim()])
+z_block[1].set_local(z.get_local()[V.dim():])
+
+assert np.linalg.norm(ii_convert(A_bc*z_block).get_local() - (AA*z).get_local(), np.inf) < 1E-10
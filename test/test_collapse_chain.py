@@ -0,0 +1,39 @@
+from dolfin import *
+from block import block_mat, block_transpose
+from xii import ii_convert, ii_collapse
+from xii.linalg.convert import chain_order
+import numpy as np
+
+
+mesh = UnitSquareMesh(8, 8)
+V = FunctionSpace(mesh, 'CG', 1)
+Q = FunctionSpace(mesh, 'DG', 0)
+
+u, v = TrialFunction(V), TestFunction(V)
+p, q = TrialFunction(Q), TestFunction(Q)
+
+A = assemble(inner(grad(u), grad(v))*dx)
+B = assemble(inner(u.dx(0), q)*dx)
+M = assemble(inner(p, q)*dx)
+
+# Long thin chain; cheap to do right to left
+assert chain_order([(1000, 1000, 5000), (1000, 1000, 5000), (1000, 1, 1000)])[0][2] == 0
+
+dense = lambda X: X.array()
+Bt = block_transpose(B)
+# Scalars folded, order does not matter for the values
+for expr, expected in ((2*Bt*M*3*B, 6*dense(B).T.dot(dense(M)).dot(dense(B))),
+                       (A + Bt*B - A, dense(B).T.dot(dense(B))),
+                       (2*(A - A*A), 2*(dense(A) - dense(A).dot(dense(A))))):
+    C = ii_collapse(expr)
+    assert np.linalg.norm(dense(C) - expected, np.inf) < 1E-10*max(1, np.linalg.norm(expected, np.inf))
+
+# Shared subexpressions; identical blocks are still different matrices
+memo = {}
+X = ii_collapse(Bt*M*B, memo)
+Y = ii_collapse(Bt*M*B + A, memo)
+assert np.linalg.norm(dense(Y) - dense(X) - dense(A), np.inf) < 1E-10
+
+AA = block_mat([[Bt*M*B, A], [A, Bt*M*B]])
+AA_ = ii_convert(AA, algorithm=None)
+assert as_backend_type(AA_[0][0]).mat().handle != as_backend_type(AA_[1][1]).mat().handle
@@ -0,0 +1,54 @@
+from dolfin import *
+from xii import ii_Function, ii_convert
+import numpy as np
+
+
+mesh = UnitSquareMesh(4, 4)
+V = FunctionSpace(mesh, 'CG', 2)
+Q = FunctionSpace(mesh, 'DG', 0)
+W = [V, Q]
+
+wh = ii_Function(W, contiguous=True)
+x = wh.vector()
+assert x.size() == V.dim() + Q.dim()
+
+# Component to monolithic
+wh[0].vector()[:] = 1.
+wh[1].vector()[:] = 2.
+values = x.get_local()
+assert np.all(values[:V.dim()] == 1.) and np.all(values[V.dim():] == 2.)
+
+# Monolithic to component
+x[:] = 3.
+assert np.all(wh[1].vector().get_local() == 3.)
+
+# No copies in conversion
+y = ii_convert(wh.block_vec())
+assert as_backend_type(y).vec().handle == wh.petsc_vec().handle
+
+# Initialized from components
+f = interpolate(Constant(4), Q)
+wh = ii_Function(W, [Function(V), f], contiguous=True)
+assert np.all(wh.vector().get_local()[V.dim():] == 4)
+
+# Writes through either the monolithic vector or the component are seen
+# by the form cache
+from xii.assembler.form_cache import vector_version
+
+version = vector_version(wh[1].vector())
+wh.vector()[:] = 5.
+assert vector_version(wh[1].vector()) != version
+
+version = vector_version(wh[1].vector())
+wh[1].vector()[:] = 6.
+assert vector_version(wh[1].vector()) != version
+
+# Norms (cached by PETSc) see the writes of the other side
+wh = ii_Function(W, contiguous=True)
+assert wh.vector().norm('l2') == 0
+wh[0].vector()[:] = 1.
+assert abs(wh.vector().norm('l2') - np.sqrt(V.dim())) < 1E-10
+
+assert abs(wh[1].vector().norm('l2')) < 1E-15
+wh.vector()[:] = 1.
+assert abs(wh[1].vector().norm('l2') - np.sqrt(Q.dim())) < 1E-10
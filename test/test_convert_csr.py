@@ -0,0 +1,30 @@
+from dolfin import *
+from block import block_mat
+from xii import ii_convert
+import numpy as np
+
+
+mesh = UnitSquareMesh(8, 8)
+V = FunctionSpace(mesh, 'CG', 2)
+Q = FunctionSpace(mesh, 'DG', 0)
+W = [V, Q]
+
+u, p = map(TrialFunction, W)
+v, q = map(TestFunction, W)
+
+[[A00, A01],
+ [A10, A11]] = [[assemble(inner(grad(u), grad(v))*dx), assemble(inner(v.dx(0), p)*dx)],
+                [assemble(inner(u.dx(1), q)*dx), assemble(inner(p, q)*dx)]]
+
+for blocks in ([[A00, A01], [A10, A11]],
+               [[A00*A00, A01+A01], [2*A10 - A10, 1]],
+               [[A00, 0], [0, A11]]):
+    AA = block_mat(blocks)
+
+    X = ii_convert(AA, algorithm='csr')
+    Y = ii_convert(AA, algorithm='numpy')
+
+    X_, Y_ = as_backend_type(X).mat(), as_backend_type(Y).mat()
+    assert X_.getSize() == Y_.getSize()
+    assert X_.getInfo()['nz_used'] == Y_.getInfo()['nz_used']
+    assert np.linalg.norm(X.array() - Y.array(), np.inf) < 1E-13
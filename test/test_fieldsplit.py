@@ -0,0 +1,52 @@
+from dolfin import *
+from xii import ii_assemble, ii_convert, ii_Function, Trace, setup_fieldsplit
+from petsc4py import PETSc
+import numpy as np
+
+
+mesh = UnitSquareMesh(16, 16)
+bmesh = BoundaryMesh(mesh, 'exterior')
+
+V = FunctionSpace(mesh, 'CG', 1)
+Q = FunctionSpace(bmesh, 'CG', 1)
+W = [V, Q]
+
+u, p = map(TrialFunction, W)
+v, q = map(TestFunction, W)
+dxGamma = Measure('dx', domain=bmesh)
+
+a = [[inner(grad(u), grad(v))*dx + inner(u, v)*dx, inner(p, Trace(v, bmesh))*dxGamma],
+     [inner(Trace(u, bmesh), q)*dxGamma, 0]]
+L = [inner(Constant(1), v)*dx, inner(Constant(0), q)*dxGamma]
+
+AA, bb = map(ii_assemble, (a, L))
+A, fields = ii_convert(AA, fields=True)
+b = ii_convert(bb)
+
+assert [name for name, _ in fields] == ['0', '1']
+assert [iset.getSize() for _, iset in fields] == [V.dim(), Q.dim()]
+
+opts = PETSc.Options()
+opts.setValue('pc_fieldsplit_type', 'schur')
+opts.setValue('pc_fieldsplit_schur_fact_type', 'full')
+opts.setValue('pc_fieldsplit_schur_precondition', 'selfp')
+opts.setValue('fieldsplit_0_pc_type', 'lu')
+opts.setValue('fieldsplit_1_pc_type', 'lu')
+
+ksp = PETSc.KSP().create()
+ksp.setOperators(as_backend_type(A).mat())
+ksp.setType('gmres')
+setup_fieldsplit(ksp, fields)
+ksp.setFromOptions()
+
+x = b.copy()
+ksp.solve(as_backend_type(b).vec(), as_backend_type(x).vec())
+assert ksp.getConvergedReason() > 0
+
+x0 = b.copy()
+solve(A, x0, b)
+assert (x - x0).norm('linf') < 1E-8
+
+# Groups
+_, fields = ii_convert(AA, fields={'all': (0, 1)})
+assert fields[0][1].getSize() == V.dim() + Q.dim()
@@ -0,0 +1,54 @@
+from dolfin import *
+from xii import ii_assemble, ii_convert, Trace
+import numpy as np
+
+
+mesh = UnitSquareMesh(8, 8)
+bmesh = BoundaryMesh(mesh, 'exterior')
+
+V = FunctionSpace(mesh, 'CG', 1)
+Q = FunctionSpace(bmesh, 'CG', 1)
+
+u, q = TrialFunction(V), TestFunction(Q)
+dxGamma = Measure('dx', domain=bmesh)
+
+f = interpolate(Expression('x[0]+x[1]', degree=1), V)
+
+a = inner(Trace(u, bmesh), q)*dxGamma
+L = inner(Trace(f, bmesh), q)*dxGamma
+
+# Unchanged bilinear form hits
+A0 = ii_assemble(a)
+A1 = ii_assemble(a)
+x = Function(V).vector()
+x.set_local(np.random.rand(x.local_size()))
+assert (A0*x - A1*x).norm('linf') < 1E-15
+
+# Linear form in f is reassembled only when f changes
+b0 = ii_assemble(L)
+b1 = ii_assemble(L)
+assert (b0 - b1).norm('linf') < 1E-15
+# Returned copies are independent
+b1 *= 2
+assert (ii_assemble(L) - b0).norm('linf') < 1E-15
+
+f.vector()[:] *= 2
+b2 = ii_assemble(L)
+assert (b2 - 2*b0).norm('linf') < 1E-13
+
+# Opt-out
+b3 = ii_assemble(L, cache=False)
+assert (b3 - b2).norm('linf') < 1E-13
+
+# Re-marked subdomains are not stale
+markers = MeshFunction('size_t', bmesh, bmesh.topology().dim(), 0)
+dsGamma = Measure('dx', domain=bmesh, subdomain_data=markers)
+L = inner(Trace(f, bmesh), q)*dsGamma(1)
+assert ii_assemble(L).norm('linf') < 1E-15
+markers.set_all(1)
+assert (ii_assemble(L) - b2).norm('linf') < 1E-13
+
+# Lazy tensors are handed out as copies too
+A2 = ii_assemble(a)
+A2.chain[0].zero()
+assert (ii_assemble(a)*x - A0*x).norm('linf') < 1E-15
@@ -0,0 +1,36 @@
+from dolfin import *
+from xii import FractionalOperator
+from scipy.linalg import eigh
+import numpy as np
+
+
+mesh = UnitSquareMesh(16, 16)
+V = FunctionSpace(mesh, 'CG', 1)
+
+u, v = TrialFunction(V), TestFunction(V)
+A = assemble(inner(grad(u), grad(v))*dx + inner(u, v)*dx)
+M = assemble(inner(u, v)*dx)
+
+terms = [(1., 0.5), (2., -0.25)]
+# Dense reference
+lmbda, U = eigh(A.array(), M.array())
+f = sum(alpha*lmbda**s for alpha, s in terms)
+M_ = M.array()
+H = M_.dot(U.dot(np.diag(f).dot(U.T))).dot(M_)
+Hinv = U.dot(np.diag(1./f).dot(U.T))
+
+x = Function(V).vector()
+x.set_local(np.random.rand(x.local_size()))
+
+Binv = FractionalOperator(A, M, terms, inverse=True)
+y = Binv*x
+y0 = Hinv.dot(x.get_local())
+assert np.linalg.norm(y.get_local() - y0) < 1E-6*np.linalg.norm(y0), len(Binv.shifts)
+
+B = FractionalOperator(A, M, terms)
+y = B*x
+y0 = H.dot(x.get_local())
+assert np.linalg.norm(y.get_local() - y0) < 1E-6*np.linalg.norm(y0)
+# Bounds given means no eigenvalue estimates
+B = FractionalOperator(A, M, terms, bounds=(0.5*lmbda.min(), 2*lmbda.max()))
+assert np.linalg.norm((B*x).get_local() - y0) < 1E-6*np.linalg.norm(y0)
@@ -0,0 +1,70 @@
+from dolfin import *
+from hsmg.hseig import InterpolationMatrix
+from xii.linalg.hsmg_utils import inverse, eigenpairs, clear
+import numpy as np
+import tempfile
+import shutil
+import os
+
+
+mesh = UnitSquareMesh(10, 10)
+V = FunctionSpace(mesh, 'CG', 1)
+
+u, v = TrialFunction(V), TestFunction(V)
+a = inner(grad(u), grad(v))*dx
+m = inner(u, v)*dx
+
+A, M = assemble(a+m), assemble(m)
+I = InterpolationMatrix(A, M, 0.5)
+J = InterpolationMatrix(A, M, -0.25)
+
+x = I.create_vec()
+x.set_local(np.random.rand(x.local_size()))
+
+B = inverse(2.*I + 3*J)
+# Factored
+y = B*x
+assert np.linalg.norm(y.get_local() - B.array().dot(x.get_local())) < 1E-10
+z = (2.*I + 3*J)*y
+assert (z - x).norm('linf') < 1E-8
+
+# Sweep reuses the eigenpairs, also of reassembled matrices
+lmbda, U = eigenpairs(A, M)
+assert eigenpairs(assemble(a+m), assemble(m))[1] is U
+
+cache_dir = tempfile.mkdtemp()
+try:
+    clear()
+    eigenpairs(A, M, cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    # From disk
+    clear()
+    lmbda0, U0 = eigenpairs(A, M, cache_dir)
+    assert np.linalg.norm(U0 - U) < 1E-13
+finally:
+    shutil.rmtree(cache_dir)
+
+# Only the latest eigenpairs are kept in memory
+from xii.linalg import hsmg_utils
+from xii import ii_convert, ii_PETScPreconditioner
+from petsc4py import PETSc
+
+clear()
+for k in range(hsmg_utils.MAX_EIGENPAIRS + 2):
+    eigenpairs(assemble(Constant(k+1)*a+m), M)
+assert len(hsmg_utils._eigenpairs) == hsmg_utils.MAX_EIGENPAIRS
+
+# Matrix representation is there when needed
+assert B.matrix is B.matrix
+y0 = ii_convert(B)*x
+assert (y0 - y).norm('linf') < 1E-10
+
+# And the operator preconditions as the matrix did
+ksp = PETSc.KSP().create()
+ksp.setOperators(as_backend_type(A).mat())
+ksp.setType('cg')
+ii_PETScPreconditioner(inverse(I), ksp)
+b = as_backend_type(x).vec()
+w = b.duplicate()
+ksp.solve(b, w)
+assert ksp.getConvergedReason() > 0
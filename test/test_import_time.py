@@ -0,0 +1,27 @@
+# Time of `import xii` on top of its core dependencies; the optional ones
+# must not be loaded until their features are used
+import subprocess
+import sys
+
+
+def import_time(modules, repeats=5):
+    '''Best wall time of importing modules in a fresh interpreter'''
+    code = ';'.join(['import time', 't0 = time.time()'] +
+                    ['import %s' % m for m in modules] +
+                    ['print(time.time() - t0)'])
+    return min(float(subprocess.check_output([sys.executable, '-c', code]).split()[-1])
+               for _ in range(repeats))
+
+
+core = import_time(['dolfin', 'block', 'petsc4py.PETSc', 'scipy.sparse'])
+total = import_time(['dolfin', 'block', 'petsc4py.PETSc', 'scipy.sparse', 'xii'])
+print 'dependencies %.3fs, xii %.3fs' % (core, total - core)
+
+code = ';'.join(['import sys', 'import xii',
+                 'print(" ".join(m for m in ("quadpy", "hsmg", "networkx") if m in sys.modules))'])
+loaded = subprocess.check_output([sys.executable, '-c', code]).split()
+assert not loaded, loaded
+
+# The mesh module is compiled only when a mesh is made
+import xii.meshing.make_mesh_cpp as make_mesh_cpp
+assert make_mesh_cpp.module is None
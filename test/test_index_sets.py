@@ -0,0 +1,43 @@
+from dolfin import *
+from xii.linalg.block_utils import (ReductionOperator, group_scatters, index_set,
+                                    is_increasing)
+from xii.linalg.convert import set_lg_map
+from block import block_vec
+from petsc4py import PETSc
+import numpy as np
+
+
+assert is_increasing([1, 2, 5]) and not is_increasing([2, 2]) and not is_increasing([])
+
+assert index_set(np.arange(3, 30, 3)).getType() == PETSc.IS.Type.STRIDE
+assert index_set([0, 1, 3]).getType() == PETSc.IS.Type.GENERAL
+
+mesh = UnitSquareMesh(8, 8)
+V = FunctionSpace(mesh, 'CG', 1)
+Q = FunctionSpace(mesh, 'DG', 0)
+W = [V, Q, V, Q]
+
+bb = block_vec([Function(Wi).vector() for Wi in W])
+for i, bi in enumerate(bb):
+    bi[:] = i + 1.
+
+# Group of 3
+R = ReductionOperator([3, 4], W)
+r = R*bb
+values = r[0].get_local()
+assert np.all(values[:V.dim()] == 1.)
+assert np.all(values[V.dim():V.dim()+Q.dim()] == 2.)
+assert np.all(values[V.dim()+Q.dim():] == 3.)
+
+x = R.T*r
+assert all((xi - bi).norm('linf') < 1E-15 for xi, bi in zip(x, bb))
+
+# Scatters are shared by layout
+R1 = ReductionOperator([1, 4], W)
+assert group_scatters((Q.dim(), V.dim(), Q.dim()))[0] is group_scatters(R1.groups[1])[0]
+
+# Maps too
+A = assemble(inner(TrialFunction(V), TestFunction(V))*dx)
+B = assemble(inner(TrialFunction(V), TestFunction(V))*dx)
+set_lg_map(A), set_lg_map(B)
+assert as_backend_type(A).mat().getLGMap()[0].handle == as_backend_type(B).mat().getLGMap()[0].handle
@@ -0,0 +1,19 @@
+from dolfin import *
+from xii.meshing.make_mesh_cpp import make_mesh, fill_mesh
+import numpy as np
+
+
+for mesh in (UnitIntervalMesh(4), UnitSquareMesh(4, 4), UnitCubeMesh(2, 2, 2)):
+    tdim, gdim = mesh.topology().dim(), mesh.geometry().dim()
+    x, cells = mesh.coordinates(), mesh.cells()
+
+    # Compiled
+    mesh0 = make_mesh(x, cells, tdim, gdim)
+    # Python
+    mesh1 = Mesh()
+    fill_mesh(x, cells, tdim, gdim, mesh1)
+
+    for m in (mesh0, mesh1):
+        assert np.linalg.norm(m.coordinates() - x) < 1E-13
+        assert np.all(m.cells() == cells)
+        assert abs(assemble(Constant(1)*dx(domain=m)) - 1) < 1E-13
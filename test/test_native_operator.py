@@ -0,0 +1,51 @@
+from dolfin import *
+from xii import ii_PETScOperator, ii_Function, ii_assemble, Trace
+from petsc4py import PETSc
+import numpy as np
+
+
+mesh = UnitSquareMesh(8, 8)
+bmesh = BoundaryMesh(mesh, 'exterior')
+
+V = FunctionSpace(mesh, 'CG', 1)
+Q = FunctionSpace(bmesh, 'CG', 1)
+W = [V, Q]
+
+u, p = map(TrialFunction, W)
+v, q = map(TestFunction, W)
+dxGamma = Measure('dx', domain=bmesh)
+
+a = [[inner(grad(u), grad(v))*dx + inner(u, v)*dx, inner(p, Trace(v, bmesh))*dxGamma],
+     [inner(Trace(u, bmesh), q)*dxGamma, 0]]
+AA = ii_assemble(a)
+
+native = ii_PETScOperator(AA, native=True)
+shell = ii_PETScOperator(AA)
+assert native.getType() == PETSc.Mat.Type.NEST
+
+x = ii_Function(W)
+for xi in x:
+    xi.vector().set_local(np.random.rand(xi.function_space().dim()))
+x = x.petsc_vec()
+
+y_native, y_shell = x.duplicate(), x.duplicate()
+native.mult(x, y_native)
+shell.mult(x, y_shell)
+y_native.axpy(-1., y_shell)
+assert y_native.norm() < 1E-10*y_shell.norm()
+
+# Single block
+assert ii_PETScOperator(AA[0][0], native=True).getType() != PETSc.Mat.Type.PYTHON
+
+# Zero row and zero column get zero blocks
+for a in ([[a[0][0], a[0][1]], [0, 0]],
+          [[a[0][0], 0], [a[1][0], 0]]):
+    AA = ii_assemble(a)
+    native = ii_PETScOperator(AA, native=True)
+    assert native.getType() == PETSc.Mat.Type.NEST
+    shell = ii_PETScOperator(AA)
+
+    native.mult(x, y_native)
+    shell.mult(x, y_shell)
+    y_native.axpy(-1., y_shell)
+    assert y_native.norm() < 1E-10*y_shell.norm()
@@ -0,0 +1,45 @@
+from dolfin import *
+from xii import ii_assemble, ii_convert, Trace, profile
+from xii.assembler import reduced_assembler
+import xii.profiling
+import json
+
+
+mesh = UnitSquareMesh(8, 8)
+bmesh = BoundaryMesh(mesh, 'exterior')
+
+V = FunctionSpace(mesh, 'CG', 1)
+Q = FunctionSpace(bmesh, 'CG', 1)
+W = [V, Q]
+
+u, p = map(TrialFunction, W)
+v, q = map(TestFunction, W)
+Tu, Tv = Trace(u, bmesh), Trace(v, bmesh)
+dxGamma = Measure('dx', domain=bmesh)
+
+a = [[inner(grad(u), grad(v))*dx, inner(p, Tv)*dxGamma],
+     [inner(Tu, q)*dxGamma, 0]]
+
+# Disabled does not record anything
+ii_convert(ii_assemble(a))
+assert not profile()
+
+# Forget the substitutions so that the operators are asked for again
+reduced_assembler.clear()
+xii.profiling.enable()
+ii_convert(ii_assemble(a, cache=False))
+ii_assemble(a, cache=False)
+xii.profiling.enable(False)
+
+report = profile()
+assert report['block (0, 0)/ffc assembly']['calls'] == 2
+assert report['block (0, 0)/ffc assembly']['nnz'] > 0
+# The operator is built once and then hit
+operator = report['block (1, 0)/trace/reduction operator']
+assert operator['hits'] >= 1
+assert 'convert' in report
+# Serializable
+assert json.loads(profile(as_json=True)) == report
+
+xii.profiling.reset()
+assert not profile()
@@ -0,0 +1,59 @@
+from dolfin import *
+from xii import ii_assemble, ii_convert, Trace
+import numpy as np
+
+
+mesh = UnitSquareMesh(8, 8)
+bmesh = BoundaryMesh(mesh, 'exterior')
+
+V = FunctionSpace(mesh, 'CG', 2)
+Q = FunctionSpace(bmesh, 'CG', 1)
+
+u, v = TrialFunction(V), TestFunction(V)
+p, q = TrialFunction(Q), TestFunction(Q)
+Tu, Tv = Trace(u, bmesh), Trace(v, bmesh)
+dxGamma = Measure('dx', domain=bmesh)
+
+forms = [inner(Tu, Tv)*dxGamma,  # PtAP
+         inner(Tu, q)*dxGamma,   # A*T
+         inner(p, Tv)*dxGamma,   # T^T*A
+         inner(grad(u), grad(v))*dx + inner(Tu, Tv)*dxGamma]
+
+for a in forms:
+    A0 = ii_convert(ii_assemble(a, cache=False)).array()
+    # Symbolic and then numeric only
+    for _ in range(2):
+        A = ii_assemble(a, cache=False, collapse=True)
+        assert isinstance(A, GenericMatrix)
+        assert np.linalg.norm(A.array() - A0, np.inf) < 1E-12
+
+# Results are not overwritten by the next product
+c = Constant(1)
+a = c*inner(Tu, Tv)*dxGamma
+A0 = ii_assemble(a, cache=False, collapse=True)
+X0 = A0.array()
+c.assign(2)
+A1 = ii_assemble(a, cache=False, collapse=True)
+assert np.linalg.norm(A0.array() - X0, np.inf) < 1E-15
+assert np.linalg.norm(A1.array() - 2*X0, np.inf) < 1E-12
+
+# With the form cache the (lazy) cached tensors share the reduction
+# operators so PtAP of the product is set up once and then reused
+from xii.linalg import ptap
+
+c = Constant(1)
+a = c*inner(Tu, Tv)*dxGamma
+X0 = ii_convert(ii_assemble(a, cache=False)).array()
+
+ptap.clear()
+for k in (1., 2., 3.):
+    c.assign(k)
+    A = ii_assemble(a, collapse=True)
+    assert np.linalg.norm(A.array() - k*X0, np.inf) < 1E-12
+    assert len(ptap._products) == 1
+
+# Bounded
+ptap.MAX_PRODUCTS = 1
+for a in forms:
+    ii_assemble(a, cache=False, collapse=True)
+    assert len(ptap._products) == 1
@@ -0,0 +1,31 @@
+from dolfin import *
+from xii import ii_assemble, Trace
+from xii.assembler import reduced_assembler
+import numpy as np
+
+
+mesh = UnitSquareMesh(8, 8)
+bmesh = BoundaryMesh(mesh, 'exterior')
+
+V = FunctionSpace(mesh, 'CG', 1)
+Q = FunctionSpace(bmesh, 'CG', 1)
+
+f = interpolate(Expression('x[0]+x[1]', degree=1), V)
+v, q = TestFunction(V), TestFunction(Q)
+dxGamma = Measure('dx', domain=bmesh)
+
+L = inner(Trace(f, bmesh), Trace(v, bmesh))*dxGamma
+
+b0 = ii_assemble(L, cache=False)
+nsubs = len(reduced_assembler._substitutions)
+# Values are not aliased with the assembler's work vectors
+b0_values = b0.get_local()
+for k in (2., 3.):
+    f.vector()[:] *= k
+    b = ii_assemble(L, cache=False)
+    # No new substitutions for the same form
+    assert len(reduced_assembler._substitutions) == nsubs
+
+    assert np.linalg.norm(b0.get_local() - b0_values) < 1E-13
+    assert np.linalg.norm(b.get_local() - k*b0_values) < 1E-10*b.norm('l2')
+    b0, b0_values = b, b.get_local()
@@ -0,0 +1,72 @@
+from dolfin import *
+from xii import EmbeddedMesh
+from xii.assembler.trace_form import trace_space
+from xii.assembler.space_registry import dof_coordinates, cell_dofs
+import numpy as np
+
+
+mesh = UnitSquareMesh(8, 8)
+bmesh = BoundaryMesh(mesh, 'exterior')
+
+V = FunctionSpace(mesh, 'CG', 2)
+# Same space is handed out
+TV = trace_space(V, bmesh)
+assert TV is trace_space(V, bmesh)
+# Different element gives a different one
+assert TV is not trace_space(FunctionSpace(mesh, 'CG', 1), bmesh)
+
+x = dof_coordinates(TV)
+assert x is dof_coordinates(TV)
+assert np.linalg.norm(x - TV.tabulate_dof_coordinates().reshape((TV.dim(), -1))) < 1E-15
+
+dofs = cell_dofs(TV)
+assert all(np.all(dofs[c] == TV.dofmap().cell_dofs(c)) for c in range(bmesh.num_cells()))
+
+# Subspaces are not confused with collapsed spaces
+W = VectorFunctionSpace(mesh, 'CG', 1)
+assert not np.all(cell_dofs(W.sub(0)) == cell_dofs(W.sub(0).collapse()))
+
+# Periodic space is not confused with the plain one
+class Periodic(SubDomain):
+    def inside(self, x, on_boundary):
+        return near(x[0], 0) and on_boundary
+
+    def map(self, x, y):
+        y[0] = x[0] - 1.
+        y[1] = x[1]
+
+P = FunctionSpace(mesh, 'CG', 1, constrained_domain=Periodic())
+Q = FunctionSpace(mesh, 'CG', 1)
+assert cell_dofs(P).max() < cell_dofs(Q).max()
+
+# Nor are subspaces of different mixed spaces
+Pelm, Qelm = FiniteElement('Lagrange', triangle, 1), FiniteElement('Lagrange', triangle, 2)
+W0 = FunctionSpace(mesh, MixedElement([Pelm, Pelm]))
+W1 = FunctionSpace(mesh, MixedElement([Pelm, Qelm]))
+assert cell_dofs(W0.sub(0)).max() < cell_dofs(W1.sub(0)).max()
+
+# Data goes with the space
+import gc
+from xii.assembler import space_registry
+
+key = space_registry.space_key(Q)
+del P, Q
+gc.collect()
+assert key not in space_registry._cell_dofs
+
+# Moved mesh gets new coordinates
+x = dof_coordinates(TV)
+bmesh.coordinates()[:] *= 2
+space_registry.invalidate(bmesh)
+assert np.linalg.norm(dof_coordinates(TV) - 2*x) < 1E-13
+
+# Reduced spaces do not keep their meshes alive
+import weakref
+from xii.assembler.trace_form import trace_space
+
+bmesh = BoundaryMesh(UnitSquareMesh(4, 4), 'exterior')
+ref = weakref.ref(bmesh)
+TV = trace_space(FunctionSpace(mesh, 'CG', 1), bmesh)
+del TV, bmesh
+gc.collect()
+assert ref() is None
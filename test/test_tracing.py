@@ -0,0 +1,43 @@
+from dolfin import *
+from xii import EmbeddedMesh, ii_assemble, ii_convert, Trace, tracing
+from xii.profiling import span
+import tempfile
+import json
+import os
+
+
+mesh = UnitSquareMesh(8, 8)
+facet_f = MeshFunction('size_t', mesh, 1, 0)
+CompiledSubDomain('near(x[0], 0.5)').mark(facet_f, 1)
+
+fd, path = tempfile.mkstemp(suffix='.json')
+os.close(fd)
+
+with tracing(path):
+    bmesh = EmbeddedMesh(facet_f, 1)
+
+    V = FunctionSpace(mesh, 'CG', 1)
+    Q = FunctionSpace(bmesh, 'CG', 1)
+    u, p = TrialFunction(V), TrialFunction(Q)
+    v, q = TestFunction(V), TestFunction(Q)
+    dxGamma = Measure('dx', domain=bmesh)
+
+    a = [[inner(grad(u), grad(v))*dx, inner(p, Trace(v, bmesh))*dxGamma],
+         [inner(Trace(u, bmesh), q)*dxGamma, 0]]
+    A = ii_convert(ii_assemble(a))
+
+    with span('solve', size=A.size(0)):
+        pass
+
+try:
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+finally:
+    os.remove(path)
+names = set(e['name'] for e in events)
+assert set(('EmbeddedMesh', 'ii_assemble', 'reduction operator', 'convert', 'solve')) <= names
+
+operator, = [e for e in events if e['name'] == 'reduction operator']
+assert operator['args']['kind'] == 'trace' and operator['args']['nnz'] > 0
+# Inner loop steps do not end up in the timeline
+assert 'basis evaluation' not in names
@@ -0,0 +1,44 @@
+from dolfin import *
+from block import block_transpose
+from xii import ii_collapse
+from xii.linalg.matrix_utils import transpose_matrix
+import numpy as np
+
+
+mesh = UnitSquareMesh(8, 8)
+V = FunctionSpace(mesh, 'CG', 1)
+Q = FunctionSpace(mesh, 'DG', 0)
+
+B = assemble(inner(TrialFunction(V).dx(0), TestFunction(Q))*dx)
+B_ = as_backend_type(B).mat()
+
+# Formed once
+Bt0 = transpose_matrix(B)
+Bt1 = transpose_matrix(B)
+assert as_backend_type(Bt0).mat().handle == as_backend_type(Bt1).mat().handle
+assert np.linalg.norm(Bt0.array() - B.array().T) < 1E-13
+
+# But a collapsed transpose is the caller's (e.g. to apply bcs to)
+C = ii_collapse(block_transpose(B))
+assert as_backend_type(C).mat().handle != as_backend_type(Bt0).mat().handle
+C *= 0.
+assert np.linalg.norm(Bt0.array() - B.array().T) < 1E-13
+# Also as blocks
+from block import block_mat
+from xii import ii_convert
+
+AA = ii_convert(block_mat([[0, B], [block_transpose(B), 0]]), algorithm=None)
+BB = ii_convert(block_mat([[0, B], [block_transpose(B), 0]]), algorithm=None)
+AA[1][0] *= 0.
+assert np.linalg.norm(BB[1][0].array() - B.array().T) < 1E-13
+
+# Until B changes
+B *= 2.
+Bt2 = transpose_matrix(B)
+assert as_backend_type(Bt2).mat().handle != as_backend_type(Bt0).mat().handle
+assert np.linalg.norm(Bt2.array() - B.array().T) < 1E-13
+
+# Or the transpose itself was changed
+Bt2 *= 0.
+Bt3 = transpose_matrix(B)
+assert np.linalg.norm(Bt3.array() - B.array().T) < 1E-13
@@ -0,0 +1,45 @@
+from dolfin import *
+from xii import Trace
+from ufl.corealg.traversal import traverse_unique_terminals, unique_pre_traversal
+from xii.assembler.ufl_utils import replace
+from xii.assembler import ufl_utils
+
+
+mesh = UnitSquareMesh(4, 4)
+bmesh = BoundaryMesh(mesh, 'exterior')
+
+V = FunctionSpace(mesh, 'CG', 1)
+Q = FunctionSpace(bmesh, 'CG', 1)
+
+u = Function(V)
+v = TestFunction(V)
+Tu, Tv = Trace(u, bmesh), Trace(v, bmesh)
+q = TestFunction(Q)
+
+# Only the terminal with the attribute is replaced
+expr = inner(Tu, Tv) + inner(u, v)
+new = replace(expr, Tv, q, attributes=('trace_', ))
+terminals = set(traverse_unique_terminals(new))
+assert q in terminals and v in terminals
+
+# Large expression with lots of sharing; linear cost, i.e. every unique
+# node is looked at (at most) twice, before and after its operands
+visits = [0]
+def counted(matches):
+    def wrapper(*args, **kwargs):
+        visits[0] += 1
+        return matches(*args, **kwargs)
+    return wrapper
+ufl_utils.matches = counted(ufl_utils.matches)
+
+for n in (10, 20, 40):
+    e = Tu
+    for i in range(n):
+        e = e*e + Tu
+    nnodes = len(list(unique_pre_traversal(e)))
+    assert nnodes <= 2*n + 1
+
+    visits[0] = 0
+    new = replace(e, Tu, q, attributes=('trace_', ))
+    assert visits[0] <= 2*nnodes
+    assert u not in set(traverse_unique_terminals(new))
@@ -0,0 +1,56 @@
+from dolfin import *
+from xii import VectorizedOperator
+import numpy as np
+
+
+mesh = UnitSquareMesh(10, 10)
+VV = VectorFunctionSpace(mesh, 'CG', 1, 3)
+V = FunctionSpace(mesh, 'CG', 1)
+
+u, v = TrialFunction(V), TestFunction(V)
+# Nonsymmetric to see the transpose
+A = assemble(inner(grad(u), grad(v))*dx + inner(u.dx(0), v)*dx)
+
+x = Function(VV).vector()
+x.set_local(np.random.rand(x.local_size()))
+
+batched = VectorizedOperator(A, VV)
+loop = VectorizedOperator(A, VV, batched=False)
+assert batched.batched and not loop.batched
+
+for _ in range(2):
+    assert (batched*x - loop*x).norm('linf') < 1E-12
+    assert (batched.T*x - loop.T*x).norm('linf') < 1E-12
+
+
+class DenseOperator(object):
+    '''Operator with action on multivectors'''
+    def __init__(self, A):
+        self.A = A
+        self.array = A.array()
+    
+    def matmat(self, X):
+        return self.array.dot(X)
+
+    def __mul__(self, x):
+        return self.A*x
+    
+dense = VectorizedOperator(DenseOperator(A), VV)
+assert dense.batched and not dense.batched_transpose
+assert (dense*x - loop*x).norm('linf') < 1E-12
+# Without the transpose action there is no transpose
+try:
+    dense.T*x
+    assert False
+except ValueError:
+    pass
+
+
+class TransposableDenseOperator(DenseOperator):
+    '''Also action of the transpose on multivectors'''
+    def rmatmat(self, X):
+        return self.array.T.dot(X)
+
+dense = VectorizedOperator(TransposableDenseOperator(A), VV)
+assert dense.batched_transpose
+assert (dense.T*x - loop.T*x).norm('linf') < 1E-12
@@ -0,0 +1,79 @@
+from dolfin import *
+from xii import ii_assemble, ii_convert, ii_PETScOperator, ii_Function, Trace
+from xii.linalg.block_utils import VectorizedOperator, ReductionOperator, apply_operator
+from block import block_vec
+import numpy as np
+
+
+def random_vec(V):
+    x = Function(V).vector()
+    x.set_local(np.random.rand(x.local_size()))
+    return x
+
+mesh = UnitSquareMesh(10, 10)
+
+# Vectorized
+VV = FunctionSpace(mesh, MixedElement([FiniteElement('Lagrange', triangle, 1)]*3))
+u, v = TrialFunction(VV), TestFunction(VV)
+M = assemble(inner(u, v)*dx)
+
+V = FunctionSpace(mesh, 'CG', 1)
+u, v = TrialFunction(V), TestFunction(V)
+x = random_vec(VV)
+y = x.copy()
+# Component by component and batched (default for matrices)
+for batched, key in ((False, 'components'), (True, 'batch')):
+    X = VectorizedOperator(assemble(inner(u, v)*dx), VV, batched=batched)
+
+    X.apply(x, out=y)
+    assert (y - M*x).norm('linf') < 1E-13
+    # Second application reuses the work of the first one
+    work = X.pool[key]
+    X.apply(x, out=y)
+    assert X.pool[key] is work
+    assert (X*x - M*x).norm('linf') < 1E-13
+
+# Reduction
+Q = FunctionSpace(mesh, 'DG', 0)
+W = [V, Q, V]
+R = ReductionOperator([2, 3], W)
+
+bb = block_vec(map(random_vec, W))
+r = R*bb
+assert r[0].size() == V.dim() + Q.dim()
+assert abs(r[0].norm('l1') - bb[0].norm('l1') - bb[1].norm('l1')) < 1E-10
+
+unpacked = R.create_vec(1)
+R.apply_transpose(r, out=unpacked)
+assert all((xi - yi).norm('linf') < 1E-15 for xi, yi in zip(bb, unpacked))
+
+# Shell operator does not copy the result
+mesh = UnitSquareMesh(8, 8)
+bmesh = BoundaryMesh(mesh, 'exterior')
+
+V = FunctionSpace(mesh, 'CG', 1)
+Q = FunctionSpace(bmesh, 'CG', 1)
+W = [V, Q]
+
+u, p = map(TrialFunction, W)
+v, q = map(TestFunction, W)
+dxGamma = Measure('dx', domain=bmesh)
+
+a = [[inner(grad(u), grad(v))*dx + inner(u, v)*dx, inner(p, Trace(v, bmesh))*dxGamma],
+     [inner(Trace(u, bmesh), q)*dxGamma, 0]]
+AA = ii_assemble(a)
+
+x = ii_Function(W)
+for xi in x:
+    xi.vector().set_local(np.random.rand(xi.function_space().dim()))
+
+y0 = AA*x.block_vec()
+y = ii_Function(W)
+apply_operator(AA, x.block_vec(), y.block_vec())
+assert all((yi - y0i).norm('linf') < 1E-10 for yi, y0i in zip(y.vectors(), y0))
+
+shell = ii_PETScOperator(AA)
+x_, y_ = x.petsc_vec(), x.petsc_vec().duplicate()
+shell.mult(x_, y_)
+shell.mult(x_, y_)
+assert abs(y_.norm() - ii_convert(y0).norm('l2')) < 1E-10
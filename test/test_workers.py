@@ -0,0 +1,60 @@
+from dolfin import *
+from xii import ii_assemble, ii_convert, Trace
+from xii.assembler import form_cache, reduced_assembler
+import numpy as np
+
+
+mesh = UnitSquareMesh(16, 16)
+bmesh = BoundaryMesh(mesh, 'exterior')
+
+V = FunctionSpace(mesh, 'CG', 1)
+Q = FunctionSpace(bmesh, 'CG', 1)
+W = [V, Q]
+
+u, p = map(TrialFunction, W)
+v, q = map(TestFunction, W)
+Tu, Tv = Trace(u, bmesh), Trace(v, bmesh)
+dxGamma = Measure('dx', domain=bmesh)
+
+f = interpolate(Expression('x[0]+x[1]', degree=1), V)
+
+a = [[inner(grad(u), grad(v))*dx + inner(Tu, Tv)*dxGamma, inner(p, Tv)*dxGamma],
+     [inner(Tu, q)*dxGamma, inner(p, q)*dxGamma]]
+L = [inner(f, v)*dx, inner(Trace(f, bmesh), q)*dxGamma]
+
+
+def assemble(workers):
+    # Start from scratch so that the threads build the shared operators
+    form_cache.clear()
+    reduced_assembler.clear()
+    A, b = ii_assemble(a, workers=workers), ii_assemble(L, workers=workers)
+    return ii_convert(A), ii_convert(b)
+
+A1, b1 = assemble(1)
+for workers in (2, 4):
+    A, b = assemble(workers)
+    assert (A1 - A).norm('linf') < 1E-13
+    assert (b1 - b).norm('linf') < 1E-13
+
+# Speedup on expensive blocks
+import multiprocessing
+import time
+
+if multiprocessing.cpu_count() > 1:
+    mesh = UnitCubeMesh(16, 16, 16)
+    bmesh = BoundaryMesh(mesh, 'exterior')
+    V = FunctionSpace(mesh, 'CG', 2)
+    Q = FunctionSpace(bmesh, 'CG', 2)
+
+    u, p = TrialFunction(V), TrialFunction(Q)
+    v, q = TestFunction(V), TestFunction(Q)
+    dxGamma = Measure('dx', domain=bmesh)
+    a = [[inner(grad(u), grad(v))*dx, inner(p, Trace(v, bmesh))*dxGamma],
+         [inner(Trace(u, bmesh), q)*dxGamma, inner(grad(p), grad(q))*dxGamma]]
+
+    timings = {}
+    for workers in (1, 2, 1, 2):  # First round compiles
+        t0 = time.time()
+        ii_assemble(a, cache=False, workers=workers)
+        timings[workers] = time.time() - t0
+    assert timings[2] < timings[1], timings
@@ -2,3 +2,4 @@ from xii.linalg import *
 from xii.assembler import *
 from xii.meshing import *
 from xii.nonlin.jacobian import block_jacobian
+from xii.profiling import profile, tracing
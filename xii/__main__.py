@@ -0,0 +1,12 @@
+# python -m xii <command> [args]
+from xii.precompile import main as precompile
+import sys
+
+COMMANDS = {'precompile': precompile}
+
+
+if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+    print 'Usage: python -m xii {%s} [args]' % ', '.join(sorted(COMMANDS))
+    sys.exit(1)
+
+sys.exit(COMMANDS[sys.argv[1]](sys.argv[2:]))
@@ -4,4 +4,5 @@ from . extension_form import Extension
 from . restriction_form import Restriction
 from . point_trace_form import PointTrace
 from . xii_assembly import assemble as ii_assemble
+from . assembly_plan import assemble_symbolic as ii_assemble_symbolic
 from . average_shape import Square, SquareRim, Circle, Disk
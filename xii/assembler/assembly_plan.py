@@ -0,0 +1,274 @@
+from ufl.corealg.traversal import traverse_unique_terminals
+from ufl.form import Form
+
+from xii.assembler.trace_form import trace_integrals
+from xii.assembler.average_form import average_integrals
+from xii.assembler.extension_form import extension_integrals
+from xii.assembler.restriction_form import restriction_integrals
+from xii.assembler.trace_assembly import TraceFormAssembler
+from xii.assembler.average_assembly import AverageFormAssembler
+from xii.assembler.extension_assembly import ExtensionFormAssembler
+from xii.assembler.restriction_assembly import RestrictionFormAssembler
+from xii.assembler.point_trace_assembly import PointTraceFormAssembler
+import xii.assembler.xii_assembly
+
+from xii.assembler.ufl_utils import form_arity, is_test_function, is_trial_function
+from xii.linalg.matrix_utils import is_number, as_petsc
+from xii.linalg.list_utils import shape_list, flatten_list
+from xii.linalg.block_utils import group_scatters
+from xii.linalg.convert import convert, COMM
+from xii.linalg.ptap import product
+
+from block import block_mat, block_vec
+from petsc4py import PETSc
+import dolfin as df
+import numpy as np
+
+
+REDUCERS = (('trace_', TraceFormAssembler()),
+            ('average_', AverageFormAssembler()),
+            ('extension_', ExtensionFormAssembler()),
+            ('restriction_', RestrictionFormAssembler()),
+            ('dirac_', PointTraceFormAssembler()))
+# Those tried by ii_assemble (in its order)
+ASSEMBLERS = tuple(assembler for attr, assembler in REDUCERS if attr != 'dirac_')
+
+
+def is_reduced_form(form):
+    '''Does the form need xii to assemble'''
+    return any(select(form) for select in (trace_integrals,
+                                           average_integrals,
+                                           extension_integrals,
+                                           restriction_integrals))
+
+
+def reduction_operators(form):
+    '''The (memoized) reduction operators used in assembling the form'''
+    operators = {}
+    for integral in form.integrals():
+        reduced_mesh = integral.ufl_domain().ufl_cargo()
+
+        for t in traverse_unique_terminals(integral.integrand()):
+            for attr, assembler in REDUCERS:
+                if not hasattr(t, attr): continue
+
+                V = t.function_space()
+                TV = assembler.reduced_space(V, reduced_mesh)
+                data = assembler.reduction_matrix_data(t)
+                T = assembler.reduction_matrix(V, TV, reduced_mesh, data)
+                operators[id(T)] = T
+    return operators.values()
+
+
+def reduced_terms(form):
+    '''
+    The form as a sum of terms (Tl, plain form, Tr, updates) each being
+    Tl^T*assemble(plain form)*Tr (T* None meaning identity). Before the
+    plain form is assembled updates (T, x, y) must set y = T*x, i.e. the
+    reduced coefficients.
+    '''
+    # Like ii_assemble the first assembler with reduced integrals takes it
+    for assembler in ASSEMBLERS:
+        reduced_integrals = assembler.select_integrals(form)
+        if reduced_integrals: break
+    else:
+        return [(None, form, None, ())]
+
+    terms = []
+    for integral in form.integrals():
+        if integral not in reduced_integrals:
+            terms.extend(reduced_terms(Form([integral])))
+            continue
+
+        terminal, T, trace_form, work = assembler.substitute(integral)
+        for Tl, plain, Tr, updates in reduced_terms(trace_form):
+            if is_test_function(terminal):
+                assert Tl is None
+                Tl = T
+            elif is_trial_function(terminal):
+                assert Tr is None
+                Tr = T
+            else:
+                # The reduced coefficient might be reduced further
+                updates = ((T, terminal.vector(), work.vector()), ) + updates
+            terms.append((Tl, plain, Tr, updates))
+    return terms
+
+
+class ReducedTerm(object):
+    '''
+    Tl^T*A*Tr (Tl^T*b) where A (b) is the assembled plain form. The tensors
+    are allocated by the first assembly, the next ones refill them.
+    '''
+    def __init__(self, Tl, form, Tr, updates):
+        self.Tl, self.Tr, self.updates = Tl, Tr, updates
+        # Compiled once
+        self.form = df.Form(form)
+        self.is_matrix = form_arity(form) == 2
+
+        self.A = None
+        self.C, self.work = PETSc.Mat(), PETSc.Mat()
+        self.b = None if Tl is None or self.is_matrix else as_petsc(Tl).createVecRight()
+
+    def assemble(self):
+        '''Refill and return the PETSc tensor of the term'''
+        for T, x, y in self.updates:
+            T.mult(x, y)
+
+        if self.A is None:
+            self.A = df.assemble(self.form)
+        else:
+            df.assemble(self.form, tensor=self.A)
+        A_ = as_petsc(self.A)
+
+        if self.Tl is None and self.Tr is None:
+            return A_
+
+        if self.is_matrix:
+            return product(self.Tl, self.A, self.Tr, self.C, self.work)
+
+        as_petsc(self.Tl).multTranspose(A_, self.b)
+        return self.b
+
+
+def injection(n, offset, N, transpose=False):
+    '''N x n (n x N with transpose) matrix of placing n vector at offset'''
+    ones = np.ones(n)
+    indices = np.arange(n, dtype=PETSc.IntType)
+    if transpose:
+        indptr = np.arange(n+1, dtype=PETSc.IntType)
+        csr, size = (indptr, indices + offset, ones), ((n, n), (N, N))
+    else:
+        indptr = np.r_[np.zeros(offset), np.arange(n+1), n*np.ones(N-n-offset)]
+        csr, size = (indptr.astype(PETSc.IntType), indices, ones), ((N, N), (n, n))
+    return PETSc.Mat().createAIJ(size=size, csr=csr, comm=COMM)
+
+
+def assemble_symbolic(form):
+    '''
+    Assemble the (block) form once to establish the layout and sparsity
+    of the blocks and the monolithic tensor. The returned plan refills
+    the values in place.
+    '''
+    return AssemblyPlan(form)
+
+
+class AssemblyPlan(object):
+    '''
+    Assembled layout of a (block) form. Reassembly (numeric phase) by
+    `assemble` reuses the block tensors, the monolithic tensor and all the
+    intermediate tensors allocated here (symbolic phase). Reduced bilinear
+    forms are assembled collapsed (see ii_assemble(collapse=True)) so every
+    block is one matrix.
+    '''
+    def __init__(self, form):
+        # Single form is 1x1 block or a block vector with one block
+        if isinstance(form, Form):
+            form = [[form]] if form_arity(form) == 2 else [form]
+
+        self.shape = shape_list(form)
+        assert len(self.shape) in (1, 2)
+
+        self.forms = flatten_list(form)
+        self.is_reduced = [not is_number(f) and is_reduced_form(f) for f in self.forms]
+
+        self.operators = sum((reduction_operators(f) for f, red in zip(self.forms, self.is_reduced)
+                              if red), [])
+
+        self.terms = [[ReducedTerm(*term) for term in reduced_terms(f)] if red else None
+                      for f, red in zip(self.forms, self.is_reduced)]
+        # Plain forms compiled once
+        self.compiled = [df.Form(f) if not (red or is_number(f)) else None
+                         for f, red in zip(self.forms, self.is_reduced)]
+
+        tensors = []
+        for f, terms in zip(self.forms, self.terms):
+            if terms is None:
+                tensors.append(f if is_number(f) else xii.assembler.xii_assembly.assemble(f, cache=False))
+                continue
+            # Sum of terms with the union of their sparsity patterns
+            tensor = None
+            for term in terms:
+                t = term.assemble()
+                if tensor is None:
+                    tensor = t.copy()
+                elif isinstance(t, PETSc.Vec):
+                    tensor.axpy(1., t)
+                else:
+                    tensor.axpy(1., t, PETSc.Mat.Structure.DIFFERENT_NONZERO_PATTERN)
+            tensors.append((df.PETScVector if isinstance(tensor, PETSc.Vec) else df.PETScMatrix)(tensor))
+
+        if len(self.shape) == 1:
+            self.blocks = block_vec(tensors)
+            self.tensor = convert(self.blocks)
+            self.flat_blocks = list(self.blocks.blocks)
+            # Block -> monolithic in reverse mode
+            self.scatters = group_scatters([b.size() for b in self.blocks])
+        else:
+            nrows, ncols = self.shape
+            blocks = [tensors[i*ncols:(i+1)*ncols] for i in range(nrows)]
+            # Numbers become matrices
+            self.blocks = convert(block_mat(blocks), algorithm=None)
+            self.tensor = convert(self.blocks)
+            self.flat_blocks = [A for row in self.blocks for A in row]
+
+            row_sizes = [row[0].size(0) for row in self.blocks]
+            col_sizes = [A.size(1) for A in self.blocks[0]]
+            row_offsets, col_offsets = np.cumsum([0] + row_sizes), np.cumsum([0] + col_sizes)
+            M, N = row_offsets[-1], col_offsets[-1]
+            # Blocks are placed in the monolithic matrix as E_i*A_ij*F_j^T
+            E = [injection(n, o, M) for n, o in zip(row_sizes, row_offsets)]
+            F = [injection(n, o, N, transpose=True) for n, o in zip(col_sizes, col_offsets)]
+            self.placements = [(E[i], F[j], PETSc.Mat(), PETSc.Mat())
+                               for i in range(nrows) for j in range(ncols)]
+
+    def refill(self):
+        '''Reassemble the blocks in place'''
+        for form, compiled, terms, block in zip(self.forms, self.compiled, self.terms, self.flat_blocks):
+            if is_number(form): continue
+
+            if terms is None:
+                df.assemble(compiled, tensor=block)
+                continue
+
+            block_ = as_petsc(block)
+            block_.zeroEntries()
+            for term in terms:
+                if len(self.shape) == 1:
+                    block_.axpy(1., term.assemble())
+                else:
+                    block_.axpy(1., term.assemble(), PETSc.Mat.Structure.SUBSET_NONZERO_PATTERN)
+
+    def assemble(self, into=None):
+        '''
+        Refill the values of blocks and the monolithic tensor. Into is the
+        monolithic tensor or block_mat/block_vec with the layout of the plan
+        (default the plan's own monolithic tensor).
+        '''
+        self.refill()
+
+        if into is None: into = self.tensor
+        # Blocks
+        if isinstance(into, (block_mat, block_vec)):
+            if into is not self.blocks:
+                target = into.blocks if len(self.shape) == 1 else [A for row in into for A in row]
+                for source, block in zip(self.flat_blocks, target):
+                    if len(self.shape) == 1:
+                        as_petsc(source).copy(as_petsc(block))
+                    else:
+                        as_petsc(source).copy(as_petsc(block), PETSc.Mat.Structure.SAME_NONZERO_PATTERN)
+            return into
+
+        # Monolithic
+        if len(self.shape) == 1:
+            vec = as_petsc(into)
+            for scatter, block in zip(self.scatters, self.flat_blocks):
+                scatter.scatter(as_petsc(block), vec, PETSc.InsertMode.INSERT, PETSc.ScatterMode.REVERSE)
+        else:
+            mat = as_petsc(into)
+            mat.zeroEntries()
+            for (E, F, EA, EAF), block in zip(self.placements, self.flat_blocks):
+                E.matMult(as_petsc(block), EA)
+                EA.matMult(F, EAF)
+                mat.axpy(1., EAF, PETSc.Mat.Structure.SUBSET_NONZERO_PATTERN)
+        return into
@@ -34,5 +34,5 @@ class AverageFormAssembler(ReducedFormAssembler):
 
 # Expose
     
-def assemble_form(form, arity, assembler=AverageFormAssembler()):
-    return assembler.assemble(form, arity)
+def assemble_form(form, arity, collapse=False, cache=True, assembler=AverageFormAssembler()):
+    return assembler.assemble(form, arity, collapse, cache)
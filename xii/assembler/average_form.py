@@ -1,5 +1,6 @@
 from xii.assembler.ufl_utils import *
 from xii.linalg.matrix_utils import is_number
+from xii.assembler.space_registry import memoize_space
 
 from ufl.corealg.traversal import traverse_unique_terminals
 import dolfin as df
@@ -24,6 +25,7 @@ def average_cell(o):
     return ufl.Cell(cell_name, o.geometric_dimension())
 
 
+@memoize_space
 def average_space(V, mesh):
     '''Construct a space over mesh where surface averages of V should live'''
     # Sanity
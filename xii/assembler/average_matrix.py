@@ -1,5 +1,7 @@
 from xii.linalg.matrix_utils import petsc_serial_matrix, is_number
 from xii.assembler.average_form import average_cell, average_space
+from xii.assembler.space_registry import dof_coordinates, build_lock
+from xii.profiling import phase, step, cache_access
 
 from numpy.polynomial.legendre import leggauss
 from dolfin import PETScMatrix, cells, Point, Cell, Function
@@ -15,8 +17,14 @@ def memoize_average(average_mat):
                (TV.ufl_element(), TV.mesh().id()),
                data['shape'])
 
-        if key not in cache:
-            cache[key] = average_mat(V, TV, reduced_mesh, data)
+        with build_lock:
+            hit = key in cache
+            if not hit:
+                with phase('reduction operator', kind='average', element=str(V.ufl_element()),
+                           cells=V.mesh().num_cells(), reduced_cells=TV.mesh().num_cells()) as span:
+                    cache[key] = average_mat(V, TV, reduced_mesh, data)
+                    span.describe(cache[key])
+        cache_access('reduction operator', hit, cache[key])
         return cache[key]
     
     return cached_average_mat
@@ -75,7 +83,7 @@ def average_matrix(V, TV, shape):
     tree = mesh.bounding_box_tree()
     limit = mesh.num_cells()
 
-    TV_coordinates = TV.tabulate_dof_coordinates().reshape((TV.dim(), -1))
+    TV_coordinates = dof_coordinates(TV)
     line_mesh = TV.mesh()
     
     TV_dm = TV.dofmap()
@@ -107,13 +115,15 @@ def average_matrix(V, TV, shape):
 
                 data = {}
                 for index, ip in enumerate(integration_points):
-                    c = tree.compute_first_entity_collision(Point(*ip))
+                    with step('point location'):
+                        c = tree.compute_first_entity_collision(Point(*ip))
                     if c >= limit: continue
 
-                    Vcell = Cell(mesh, c)
-                    vertex_coordinates = Vcell.get_vertex_coordinates()
-                    cell_orientation = Vcell.orientation()
-                    Vel.evaluate_basis_all(basis_values, ip, vertex_coordinates, cell_orientation)
+                    with step('basis evaluation'):
+                        Vcell = Cell(mesh, c)
+                        vertex_coordinates = Vcell.get_vertex_coordinates()
+                        cell_orientation = Vcell.orientation()
+                        Vel.evaluate_basis_all(basis_values, ip, vertex_coordinates, cell_orientation)
 
                     cols_ip = V_dm.cell_dofs(c)
                     values_ip = basis_values*wq[index]
@@ -127,10 +137,11 @@ def average_matrix(V, TV, shape):
                 # The thing now that with data we can assign to several
                 # rows of the matrix
                 column_indices = np.array(data.keys(), dtype='int32')
-                for shift in range(value_size):
-                    row = scalar_row + shift
-                    column_values = np.array([data[col][shift] for col in column_indices])
-                    mat.setValues([row], column_indices, column_values, PETSc.InsertMode.INSERT_VALUES)
+                with step('matrix insertion'):
+                    for shift in range(value_size):
+                        row = scalar_row + shift
+                        column_values = np.array([data[col][shift] for col in column_indices])
+                        mat.setValues([row], column_indices, column_values, PETSc.InsertMode.INSERT_VALUES)
             # On to next avg point
         # On to next cell
     return PETScMatrix(mat)
@@ -168,7 +179,7 @@ def trace_3d1d_matrix(V, TV, reduced_mesh):
             lambda index: index if index<bound else None
         )(tree.compute_first_entity_collision(c.midpoint()))
   
-    TV_coordinates = TV.tabulate_dof_coordinates().reshape((TV.dim(), -1))
+    TV_coordinates = dof_coordinates(TV)
     TV_dm = TV.dofmap()
     V_dm = V.dofmap()
     # For non scalar we plan to make compoenents by shift
@@ -224,7 +235,7 @@ def MeasureFunction(averaged):
     # Finally
     TV = average_space(V, mesh_1d)
 
-    TV_coordinates = TV.tabulate_dof_coordinates().reshape((TV.dim(), -1))
+    TV_coordinates = dof_coordinates(TV)
     TV_dm = TV.dofmap()
     
     visited = np.zeros(TV.dim(), dtype=bool)
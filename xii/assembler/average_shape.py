@@ -5,7 +5,6 @@ from math import pi, sqrt
 import numpy as np
 
 from numpy.polynomial.legendre import leggauss
-import quadpy
 
 from xii.linalg.matrix_utils import is_number
 from xii.assembler.average_form import average_space
@@ -194,7 +193,11 @@ class Disk(BoundingSurface):
             self.radius = radius
 
         # Will use quadrature from quadpy over unit disk in z=0 plane
-        # and center (0, 0, 0)
+        # and center (0, 0, 0). It is slow to import and only Disk needs it
+        try:
+            import quadpy
+        except ImportError:
+            raise ImportError('Disk averaging requires quadpy')
         quad = quadpy.disk.Lether(degree)
         self.xq, self.wq = quad.points, quad.weights
 
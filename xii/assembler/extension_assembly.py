@@ -36,5 +36,5 @@ class ExtensionFormAssembler(ReducedFormAssembler):
         return extension_mat(V, TV, extended_mesh, data)
 
 # Expose
-def assemble_form(form, arity, assembler=ExtensionFormAssembler()):
-    return assembler.assemble(form, arity)
+def assemble_form(form, arity, collapse=False, cache=True, assembler=ExtensionFormAssembler()):
+    return assembler.assemble(form, arity, collapse, cache)
@@ -1,4 +1,6 @@
 from xii.linalg.convert import numpy_to_petsc
+from xii.assembler.space_registry import dof_coordinates, build_lock
+from xii.profiling import phase, cache_access
 from scipy.spatial.distance import cdist
 from scipy.sparse import csr_matrix
 import dolfin as df
@@ -15,8 +17,14 @@ def memoize_ext(ext_mat):
                (TV.ufl_element(), TV.mesh().id()),
                data['type'])
         
-        if key not in cache:
-            cache[key] = ext_mat(V, TV, extended_mesh, data)
+        with build_lock:
+            hit = key in cache
+            if not hit:
+                with phase('reduction operator', kind='extension', element=str(V.ufl_element()),
+                           cells=V.mesh().num_cells(), reduced_cells=TV.mesh().num_cells()) as span:
+                    cache[key] = ext_mat(V, TV, extended_mesh, data)
+                    span.describe(cache[key])
+        cache_access('reduction operator', hit, cache[key])
         return cache[key]
 
     return cached_ext_mat
@@ -58,12 +66,12 @@ def uniform_extension_matrix(V, EV):
     is_tensor_elm = isinstance(V.ufl_element(), (df.VectorElement, df.TensorElement))
     # Base on scalar
     if is_tensor_elm:
-        V_dofs_x = V.sub(0).collapse().tabulate_dof_coordinates().reshape((-1, gdim))
-        EV_dofs_x = EV.sub(0).collapse().tabulate_dof_coordinates().reshape((-1, gdim))
+        V_dofs_x = dof_coordinates(V.sub(0).collapse())
+        EV_dofs_x = dof_coordinates(EV.sub(0).collapse())
     # Otherwise 'scalar', (Hdiv element belong here as well)
     else:
-        V_dofs_x = V.tabulate_dof_coordinates().reshape((V.dim(), gdim))
-        EV_dofs_x = EV.tabulate_dof_coordinates().reshape((EV.dim(), gdim))
+        V_dofs_x = dof_coordinates(V)
+        EV_dofs_x = dof_coordinates(EV)
         
     # Compute distance from every EV dof(row) to every V dof(column)
     lookup = cdist(EV_dofs_x, V_dofs_x)
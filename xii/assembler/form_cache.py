@@ -0,0 +1,167 @@
+from ufl.corealg.traversal import traverse_unique_terminals
+from ufl.classes import Argument, Coefficient
+from xii.assembler.space_registry import space_key
+from xii.linalg.function import is_view, VIEW_ATTR
+from xii.linalg.matrix_utils import is_reduction
+from block.block_compose import block_mul, block_add, block_sub, block_transpose
+import dolfin as df
+import threading
+
+
+# Reduced forms are costly to assemble (reduction operator, substitution,
+# assembly of the reduced form and the products) while in Newton/time loops
+# most of them do not change. We remember the assembled tensor for the form
+# and return it as long as the form is "the same". The same means equal
+# signature, same meshes/spaces/reduction data of the terminals and the
+# coefficients have the same values.
+#
+# NOTE: the form is kept in the cache entry so that the objects whose id
+# we use in the keys stay alive.
+REDUCED_ATTRIBUTES = ('trace_', 'average_', 'extension_', 'restriction_', 'dirac_')
+# Forms built over and over (e.g. in a loop) would pile up
+MAX_FORMS = 256
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def vector_version(v):
+    '''Something which changes when values of v are changed'''
+    vec = df.as_backend_type(v).vec()
+    # Writes through the owner of contiguous storage do not touch the state
+    # of the view, so the owner's state counts too
+    if is_view(vec):
+        owner, offset = vec.getAttr(VIEW_ATTR)
+        return (owner.stateGet(), offset, vec.stateGet())
+    try:
+        return vec.stateGet()
+    except AttributeError:
+        # PETSc object state is not exposed; fall back to the values
+        return hash(v.get_local().tostring())
+
+
+def attribute_key(value):
+    '''Hashable representation of the reduction data'''
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, df.Mesh):
+        return ('mesh', value.id())
+    if isinstance(value, (list, tuple)):
+        return tuple(map(attribute_key, value))
+    # Normals, shapes, ...
+    return ('id', id(value))
+
+
+def terminal_key(t):
+    '''
+    Hashable representation of the terminal as (structure, version) or
+    None if we cannot tell when the terminal changed.
+    '''
+    reduction = tuple((attr, tuple(sorted((k, attribute_key(v))
+                                          for k, v in getattr(t, attr).items())))
+                      for attr in REDUCED_ATTRIBUTES if hasattr(t, attr))
+
+    if isinstance(t, Argument):
+        return (('arg', t.number(), t.part(), space_key(t.function_space()), reduction), None)
+
+    if isinstance(t, df.Constant):
+        return (('const', t.count(), reduction), tuple(t.values()))
+
+    if isinstance(t, df.Function):
+        return (('foo', t.count(), space_key(t.function_space()), reduction),
+                vector_version(t.vector()))
+    # Expressions and alike can change without us knowing
+    if isinstance(t, Coefficient):
+        return None
+    # Geometric quantities
+    domain = t.ufl_domain()
+    return ((type(t).__name__, domain.ufl_cargo().id() if domain is not None else None), None)
+
+
+def form_key(form, *extra):
+    '''
+    Split form identity into (structure, versions). None if not cacheable.
+    Extra are assembly options which change the tensor.
+    '''
+    terminals, seen = [], set()
+    for integral in form.integrals():
+        for t in traverse_unique_terminals(integral.integrand()):
+            if t not in seen:
+                seen.add(t)
+                terminals.append(t)
+
+    keys = []
+    for t in terminals:
+        key = terminal_key(t)
+        if key is None:
+            return None
+        keys.append(key)
+
+    subdomain_data = [i.subdomain_data() for i in form.integrals()]
+
+    structure = (form.signature(),
+                 tuple(d.ufl_cargo().id() for d in form.ufl_domains()),
+                 tuple(map(id, subdomain_data)),
+                 tuple(k[0] for k in keys),
+                 extra)
+    # Markers can be changed in place
+    versions = (tuple(k[1] for k in keys), tuple(map(markers_version, subdomain_data)))
+
+    return structure, versions
+
+
+def markers_version(markers):
+    '''Something which changes when values of markers are changed'''
+    if markers is None:
+        return None
+    return hash(markers.array().tostring())
+
+
+def fresh(tensor):
+    '''
+    Callers modify plain tensors inplace, e.g. applying bcs. Lazy reduced
+    tensors (cbc.block expressions) are rebuilt around copies of their
+    assembled factors; the (shared) reduction operators are kept.
+    '''
+    if is_reduction(tensor):
+        return tensor
+    if isinstance(tensor, (df.GenericVector, df.GenericMatrix)):
+        return tensor.copy()
+    if isinstance(tensor, block_mul):
+        return block_mul(map(fresh, tensor.chain))
+    if isinstance(tensor, (block_add, block_sub)):
+        return type(tensor)(fresh(tensor.A), fresh(tensor.B))
+    if isinstance(tensor, block_transpose):
+        return block_transpose(fresh(tensor.A))
+    return tensor
+
+
+def lookup(key):
+    '''Cached tensor for the form key or None'''
+    structure, versions = key
+    with _lock:
+        if structure not in _cache:
+            return None
+        cached_versions, _, tensor = _cache[structure]
+
+    if cached_versions != versions:
+        return None
+    return fresh(tensor)
+
+
+def store(key, form, tensor):
+    '''Remember tensor as assembled form'''
+    structure, versions = key
+    # Only the latest version is kept for every form
+    with _lock:
+        if structure not in _cache and len(_cache) >= MAX_FORMS:
+            _cache.clear()
+        _cache[structure] = (versions, form, tensor)
+
+    return fresh(tensor)
+
+
+def clear():
+    '''Forget all the assembled forms'''
+    with _lock:
+        _cache.clear()
@@ -1,5 +1,7 @@
 from xii.linalg.matrix_utils import petsc_serial_matrix
 from xii.assembler.fem_eval import DegreeOfFreedom, FEBasisFunction
+from xii.assembler.space_registry import build_lock
+from xii.profiling import phase, cache_access
 from petsc4py import PETSc
 import dolfin as df
 import numpy as np
@@ -12,8 +14,14 @@ def memoize_interp(f):
         key = ((V.ufl_element(), V.mesh().id(), V.mesh().num_cells()),
                (Q.ufl_element(), Q.mesh().id(), Q.mesh().num_cells()))
                
-        if key not in cache:
-            cache[key] = f(V, Q)
+        with build_lock:
+            hit = key in cache
+            if not hit:
+                with phase('interpolation operator', element=str(V.ufl_element()),
+                           cells=V.mesh().num_cells(), target_cells=Q.mesh().num_cells()) as span:
+                    cache[key] = f(V, Q)
+                    span.describe(cache[key])
+        cache_access('interpolation operator', hit, cache[key])
         return cache[key]
     
     return cached_interpolation_mat
@@ -34,5 +34,5 @@ class PointTraceFormAssembler(ReducedFormAssembler):
 
 # Expose
     
-def assemble_form(form, arity, assembler=PointTraceFormAssembler()):
-    return assembler.assemble(form, arity)
+def assemble_form(form, arity, collapse=False, cache=True, assembler=PointTraceFormAssembler()):
+    return assembler.assemble(form, arity, collapse, cache)
@@ -1,5 +1,6 @@
 from ufl.corealg.traversal import traverse_unique_terminals
 from xii.assembler.ufl_utils import *
+from xii.assembler.space_registry import memoize_space
 import dolfin as df
 import numpy as np
 import ufl
@@ -10,6 +11,7 @@ def point_trace_cell(o):
     return o
 
 
+@memoize_space
 def point_trace_space(V, mesh):
     '''Space from point trace values live - these are just R^n'''
     shape = V.ufl_element().value_shape()
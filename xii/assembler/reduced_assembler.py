@@ -3,13 +3,26 @@ from ufl.algorithms.transformer import ufl2uflcopy
 from block import block_transpose
 from ufl.form import Form
 import dolfin as df
+import threading
 import operator
 
 from xii.assembler.trace_form import *
 from xii.assembler.ufl_utils import *
+from xii.linalg.ptap import reduced_product
+from xii.linalg.matrix_utils import mark_reduction
+from xii.assembler.space_registry import build_lock
+from xii.profiling import phase
 import xii.assembler.xii_assembly
 
 
+# Reducing an integral means finding the terminal, substituting it in the
+# integrand and allocating the reduced Function/work vector. Assembling the
+# same forms again (residuals in Newton loop) then only moves values. 
+MAX_SUBSTITUTIONS = 1024
+_substitutions = {}
+_lock = threading.Lock()
+
+
 class ReducedFormAssembler(object):
     '''
     We assemble the bilinear form into a product of algebraic representation
@@ -47,87 +60,156 @@ class ReducedFormAssembler(object):
         raise NotImplementedError
 
     # Common logic:
-    def assemble(self, form, arity):
-        '''Assemble a biliner(2), linear(1) form'''
+    def assemble(self, form, arity, collapse=False, cache=True):
+        '''
+        Assemble a biliner(2), linear(1) form. With collapse the bilinear
+        form is a single matrix T^T*A*T computed by PETSc. Cache is passed
+        on to the assembly of the reduced forms.
+        '''
         reduced_integrals = self.select_integrals(form)   #! Selector
         # Signal to xii.assemble
         if not reduced_integrals: return None
-    
-        components = []
+
+        with phase(self.attributes[0].rstrip('_')):
+            return self.assemble_reduced(form, arity, collapse, reduced_integrals, cache)
+
+    def assemble_reduced(self, form, arity, collapse, reduced_integrals, cache=True):
+        '''Sum of integrals of the form where some are reduced'''
+        ii_assemble = lambda f, collapse=False: xii.assembler.xii_assembly.assemble(
+            f, cache=cache, collapse=collapse)
+
+        components, buffers = [], []
         for integral in form.integrals():
             # Delegate to friend
             if integral not in reduced_integrals:
-                components.append(xii.assembler.xii_assembly.assemble(Form([integral])))
+                components.append(ii_assemble(Form([integral]), collapse))
                 continue
 
-            reduced_mesh = integral.ufl_domain().ufl_cargo()
-
-            integrand = integral.integrand()
-            # Split arguments in those that need to be and those that are
-            # already restricted.
-            terminals = set(traverse_unique_terminals(integrand))
-
-            # FIXME: is it enough info (in general) to decide
-            terminals_to_restrict = self.restriction_filter(terminals, reduced_mesh)
-            # You said this is a trace ingral!
-            assert terminals_to_restrict
-
-            # Let's pick a guy for restriction
-            terminal = terminals_to_restrict.pop()
-            # We have some assumption on the candidate
-            assert self.is_compatible(terminal, reduced_mesh)
-
-            data = self.reduction_matrix_data(terminal)
-                
-            integrand = ufl2uflcopy(integrand)
-            # With sane inputs we can get the reduced element and setup the
-            # intermediate function space where the reduction of terminal
-            # lives
-            V = terminal.function_space()
-            TV = self.reduced_space(V, reduced_mesh)  #! Space construc
-
-            # Setup the matrix to from space of the trace_terminal to the
-            # intermediate space. FIXME: normal and trace_mesh
-            #! mat construct
-            df.info('\tGetting reduction op'); rop_timer = df.Timer('rop')
-            T = self.reduction_matrix(V, TV, reduced_mesh, data)
-            df.info('\tDone (reduction op) %g' % rop_timer.stop())
+            terminal, T, trace_form, work = self.substitute(integral)
             # T
             if is_test_function(terminal):
-                replacement = df.TestFunction(TV)
-                # Passing the args to get the comparison a make substitution
-                integrand = replace(integrand, terminal, replacement, attributes=self.attributes)
-                trace_form = Form([integral.reconstruct(integrand=integrand)])
-
                 if arity == 2:
                     # Make attempt on the substituted form
-                    A = xii.assembler.xii_assembly.assemble(trace_form)
-                    components.append(block_transpose(T)*A)
+                    A = ii_assemble(trace_form)
+                    if collapse:
+                        components.append(reduced_product(T, A, None, product_key(trace_form)))
+                    else:
+                        components.append(block_transpose(T)*A)
                 else:
-                    b = xii.assembler.xii_assembly.assemble(trace_form)
-                    Tb = df.Function(V).vector()  # Alloc and apply
-                    T.transpmult(b, Tb)
-                    components.append(Tb)
+                    b = ii_assemble(trace_form)
+                    T.transpmult(b, work)
+                    components.append(work)
+                    buffers.append(work)
 
             if is_trial_function(terminal):
                 assert arity == 2
-                replacement = df.TrialFunction(TV)
-                # Passing the args to get the comparison
-                integrand = replace(integrand, terminal, replacement, attributes=self.attributes)
-                trace_form = Form([integral.reconstruct(integrand=integrand)])
 
-                A = xii.assembler.xii_assembly.assemble(trace_form)
-                components.append(A*T)
+                A = ii_assemble(trace_form)
+                if collapse:
+                    components.append(reduced_product(None, A, T, product_key(trace_form)))
+                else:
+                    components.append(A*T)
 
             # Okay, then this guy might be a function
             if isinstance(terminal, df.Function):
-                replacement = df.Function(TV)
                 # Replacement is not just a placeholder
-                T.mult(terminal.vector(), replacement.vector())
-                # Substitute
-                integrand = replace(integrand, terminal, replacement, attributes=self.attributes)
-                trace_form = Form([integral.reconstruct(integrand=integrand)])
-                components.append(xii.assembler.xii_assembly.assemble(trace_form))
+                T.mult(terminal.vector(), work.vector())
+                components.append(ii_assemble(trace_form))
 
         # The whole form is then the sum of integrals
-        return reduce(operator.add, components)
+        tensor = reduce(operator.add, components)
+        # Work vectors are refilled by the next assembly
+        if any(tensor is b for b in buffers):
+            tensor = tensor.copy()
+        return tensor
+
+    def substitute(self, integral):
+        '''
+        Reduction of the integral as (terminal, T, trace_form, work). The 
+        trace_form has the terminal substituted by its reduction and work is
+        where T puts the values of the reduction; (reduced) Function for 
+        coefficients, vector in V for test functions of linear forms.
+        '''
+        key = (id(integral), self.attributes)
+        with _lock:
+            if key in _substitutions:
+                return _substitutions[key][1:]
+        # Dolfin objects (spaces, functions, mesh connectivity) are built
+        # here which is not thread safe
+        with build_lock:
+            with _lock:
+                if key in _substitutions:
+                    return _substitutions[key][1:]
+            return self.substitute_(integral, key)
+
+    def substitute_(self, integral, key):
+        '''Build the substitution of integral and remember it as key'''
+        reduced_mesh = integral.ufl_domain().ufl_cargo()
+
+        integrand = integral.integrand()
+        # Split arguments in those that need to be and those that are
+        # already restricted.
+        with phase('ufl processing'):
+            terminals = set(traverse_unique_terminals(integrand))
+
+            # FIXME: is it enough info (in general) to decide
+            terminals_to_restrict = self.restriction_filter(terminals, reduced_mesh)
+        # You said this is a trace ingral!
+        assert terminals_to_restrict
+
+        # Let's pick a guy for restriction
+        terminal = terminals_to_restrict.pop()
+        # We have some assumption on the candidate
+        assert self.is_compatible(terminal, reduced_mesh)
+
+        data = self.reduction_matrix_data(terminal)
+
+        with phase('ufl processing'):
+            integrand = ufl2uflcopy(integrand)
+        # With sane inputs we can get the reduced element and setup the
+        # intermediate function space where the reduction of terminal
+        # lives
+        V = terminal.function_space()
+        TV = self.reduced_space(V, reduced_mesh)  #! Space construc
+
+        # Setup the matrix to from space of the trace_terminal to the
+        # intermediate space. FIXME: normal and trace_mesh
+        #! mat construct
+        df.info('\tGetting reduction op'); rop_timer = df.Timer('rop')
+        T = mark_reduction(self.reduction_matrix(V, TV, reduced_mesh, data))
+        df.info('\tDone (reduction op) %g' % rop_timer.stop())
+
+        work = None
+        if is_test_function(terminal):
+            replacement = df.TestFunction(TV)
+            work = df.Function(V).vector()
+        elif is_trial_function(terminal):
+            replacement = df.TrialFunction(TV)
+        else:
+            assert isinstance(terminal, df.Function)
+            replacement = work = df.Function(TV)
+        # Passing the args to get the comparison a make substitution
+        with phase('ufl processing'):
+            integrand = replace(integrand, terminal, replacement, attributes=self.attributes)
+            trace_form = Form([integral.reconstruct(integrand=integrand)])
+
+        with _lock:
+            # Forms built over and over (e.g. in a loop) would pile up
+            if len(_substitutions) > MAX_SUBSTITUTIONS:
+                _substitutions.clear()
+            # NOTE: integral is kept alive so that its id is not reused
+            _substitutions[key] = (integral, terminal, T, trace_form, work)
+        return terminal, T, trace_form, work
+
+
+def product_key(form):
+    '''Form data which determines sparsity of its matrix'''
+    return (form.signature(),
+            tuple(d.ufl_cargo().id() for d in form.ufl_domains()),
+            tuple((arg.number(), arg.function_space().id()) for arg in form.arguments()))
+
+
+def clear():
+    '''Forget the substituted integrals'''
+    with _lock:
+        _substitutions.clear()
@@ -43,5 +43,5 @@ class RestrictionFormAssembler(ReducedFormAssembler):
 
 # Expose
     
-def assemble_form(form, arity, assembler=RestrictionFormAssembler()):
-    return assembler.assemble(form, arity)
+def assemble_form(form, arity, collapse=False, cache=True, assembler=RestrictionFormAssembler()):
+    return assembler.assemble(form, arity, collapse, cache)
@@ -1,6 +1,7 @@
 from ufl.corealg.traversal import traverse_unique_terminals
 from xii.assembler.ufl_utils import *
 from xii.meshing.subdomain_mesh import SubDomainMesh
+from xii.assembler.space_registry import memoize_space
 import dolfin as df
 import ufl
 
@@ -18,6 +19,7 @@ def restriction_cell(o):
     return o
 
 
+@memoize_space
 def restriction_space(V, mesh):
     '''Construct a space where restrictions of V to mesh should live'''
     # Sanity
@@ -1,6 +1,8 @@
 from xii.linalg.matrix_utils import petsc_serial_matrix
 from xii.assembler.restriction_assembly import restriction_cell
 from xii.assembler.fem_eval import DegreeOfFreedom, FEBasisFunction
+from xii.assembler.space_registry import cell_dofs, build_lock
+from xii.profiling import phase, step, cache_access
 
 from dolfin import Cell, PETScMatrix
 from petsc4py import PETSc
@@ -14,8 +16,14 @@ def memoize_restriction(restriction_mat):
         key = ((V.ufl_element(), V.mesh().id()),
                (TV.ufl_element(), TV.mesh().id()))
 
-        if key not in cache:
-            cache[key] = restriction_mat(V, TV, reduced_mesh, data)
+        with build_lock:
+            hit = key in cache
+            if not hit:
+                with phase('reduction operator', kind='restriction', element=str(V.ufl_element()),
+                           cells=V.mesh().num_cells(), reduced_cells=TV.mesh().num_cells()) as span:
+                    cache[key] = restriction_mat(V, TV, reduced_mesh, data)
+                    span.describe(cache[key])
+        cache_access('reduction operator', hit, cache[key])
         return cache[key]
     
     return cached_restriction_mat
@@ -48,10 +56,10 @@ def restriction_matrix(V, TV, rmesh):
     mapping = rmesh.parent_entity_map[mesh.id()][tdim]  
     # The idea is to evaluate TV's degrees of freedom at basis functions
     # of V
-    Tdmap = TV.dofmap()
+    Tdmap = cell_dofs(TV)
     TV_dof = DegreeOfFreedom(TV)
 
-    dmap = V.dofmap()
+    dmap = cell_dofs(V)
     V_basis_f = FEBasisFunction(V)
 
     # Rows
@@ -62,12 +70,12 @@ def restriction_matrix(V, TV, rmesh):
 
         for trace_cell in range(TV.mesh().num_cells()):
             TV_dof.cell = trace_cell
-            trace_dofs = Tdmap.cell_dofs(trace_cell)
+            trace_dofs = Tdmap[trace_cell]
             # The corresponding cell in V mesh
             cell = mapping[trace_cell]
             V_basis_f.cell = cell
             
-            dofs = dmap.cell_dofs(cell)
+            dofs = dmap[cell]
             for local_T, dof_T in enumerate(trace_dofs):
 
                 if visited_dofs[dof_T]:
@@ -79,14 +87,16 @@ def restriction_matrix(V, TV, rmesh):
                 TV_dof.dof = local_T
                 
                 # Eval at V basis functions
-                for local, dof in enumerate(dofs):
-                    # Set which basis foo
-                    V_basis_f.dof = local
+                with step('basis evaluation'):
+                    for local, dof in enumerate(dofs):
+                        # Set which basis foo
+                        V_basis_f.dof = local
                     
-                    dof_values[local] = TV_dof.eval(V_basis_f)
+                        dof_values[local] = TV_dof.eval(V_basis_f)
 
                 # Can fill the matrix now
                 col_indices = np.array(dofs, dtype='int32')
                 # Insert
-                mat.setValues([dof_T], col_indices, dof_values, PETSc.InsertMode.INSERT_VALUES)
+                with step('matrix insertion'):
+                    mat.setValues([dof_T], col_indices, dof_values, PETSc.InsertMode.INSERT_VALUES)
     return mat
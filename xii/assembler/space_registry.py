@@ -0,0 +1,86 @@
+import threading
+import weakref
+import numpy as np
+
+
+# Reduced spaces are built over and over again by the assemblers (one per
+# reduced integral). So we keep them around together with the data about
+# them which the reduction operators tend to ask for repeatedly. Data of
+# a space is keyed by its id; element and mesh are not enough as periodic
+# (constrained) spaces or subspaces of different mixed spaces share them.
+def space_key(V):
+    '''Key identifying the function space'''
+    return V.id()
+
+
+# Spaces and reduction operators can be requested from several threads.
+# They are all built under one lock; besides making sure that each is built
+# once this guards the mesh.init calls which dolfin does not make thread
+# safe.
+build_lock = threading.RLock()
+
+
+def remember(cache, key, value, owner, mesh):
+    '''cache[key] = value until owner is garbage collected'''
+    def forget(ref, key=key):
+        cache.pop(key, None)
+    # NOTE: the weakref must live as long as the entry for the callback to fire
+    cache[key] = (value, weakref.ref(owner, forget), mesh.id())
+    return value
+
+
+def memoize_space(space):
+    '''
+    Cached construction of reduced spaces. A space is kept only while
+    someone (forms, substitutions) uses it; holding it here would keep
+    alive its mesh and so meshes of e.g. refinement loops would pile up.
+    '''
+    cache = weakref.WeakValueDictionary()
+    def cached_space(V, mesh):
+        # The reduced space is determined by the element of V and the mesh
+        key = (V.ufl_element(), mesh.id())
+
+        with build_lock:
+            TV = cache.get(key)
+            if TV is None:
+                TV = space(V, mesh)
+                cache[key] = TV
+        return TV
+
+    return cached_space
+
+
+_dof_coordinates = {}
+_cell_dofs = {}
+
+
+def dof_coordinates(V):
+    '''Coordinates of dofs in V as (V.dim(), gdim) array. Don't modify!'''
+    key = space_key(V)
+    with build_lock:
+        if key not in _dof_coordinates:
+            x = V.tabulate_dof_coordinates().reshape((V.dim(), -1))
+            x.flags.writeable = False
+            remember(_dof_coordinates, key, x, V, V.mesh())
+    return _dof_coordinates[key][0]
+
+
+def cell_dofs(V):
+    '''Dofmap of V as (num_cells, num_cell_dofs) array. Don't modify!'''
+    key = space_key(V)
+    with build_lock:
+        if key not in _cell_dofs:
+            dm, ncells = V.dofmap(), V.mesh().num_cells()
+            dofs = np.array([dm.cell_dofs(c) for c in range(ncells)], dtype='int32')
+            dofs = dofs.reshape((ncells, -1))
+            dofs.flags.writeable = False
+            remember(_cell_dofs, key, dofs, V, V.mesh())
+    return _cell_dofs[key][0]
+
+
+def invalidate(mesh=None):
+    '''Forget dof coordinates of spaces on mesh (all); call after moving it'''
+    with build_lock:
+        for key, (_, _, mesh_id) in list(_dof_coordinates.items()):
+            if mesh is None or mesh_id == mesh.id():
+                del _dof_coordinates[key]
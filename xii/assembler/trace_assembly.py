@@ -44,5 +44,5 @@ class TraceFormAssembler(ReducedFormAssembler):
 
 # Expose
     
-def assemble_form(form, arity, assembler=TraceFormAssembler()):
-    return assembler.assemble(form, arity)
+def assemble_form(form, arity, collapse=False, cache=True, assembler=TraceFormAssembler()):
+    return assembler.assemble(form, arity, collapse, cache)
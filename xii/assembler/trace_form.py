@@ -1,5 +1,6 @@
 from ufl.corealg.traversal import traverse_unique_terminals
 from xii.assembler.ufl_utils import *
+from xii.assembler.space_registry import memoize_space
 import dolfin as df
 import ufl
 
@@ -64,6 +65,7 @@ def trace_element(elm):
     return elm(family, cell, degree)
 
 
+@memoize_space
 def trace_space(V, mesh):
     '''
     Produce an intermerdiate function space for computing with trace of 
@@ -1,6 +1,8 @@
 from xii.linalg.matrix_utils import petsc_serial_matrix
 from xii.assembler.trace_assembly import trace_cell
 from xii.assembler.fem_eval import DegreeOfFreedom, FEBasisFunction
+from xii.assembler.space_registry import cell_dofs, build_lock
+from xii.profiling import phase, step, cache_access
 from xii.meshing.embedded_mesh import build_embedding_map
 from xii.assembler.nonconforming_trace_matrix import nonconforming_trace_mat
 
@@ -18,8 +20,15 @@ def memoize_trace(trace_mat):
                (TV.ufl_element(), TV.mesh().id()),
                data['restriction'], data['normal'])
                
-        if key not in cache:
-            cache[key] = trace_mat(V, TV, trace_mesh, data)
+        # Threads share the cache and each operator is built only once
+        with build_lock:
+            hit = key in cache
+            if not hit:
+                with phase('reduction operator', kind='trace', element=str(V.ufl_element()),
+                           cells=V.mesh().num_cells(), reduced_cells=TV.mesh().num_cells()) as span:
+                    cache[key] = trace_mat(V, TV, trace_mesh, data)
+                    span.describe(cache[key])
+        cache_access('reduction operator', hit, cache[key])
         return cache[key]
 
     return cached_trace_mat
@@ -83,10 +92,10 @@ def trace_mat_no_restrict(V, TV, trace_mesh=None):
 
     # The idea is to evaluate TV's degrees of freedom at basis functions
     # of V
-    Tdmap = TV.dofmap()
+    Tdmap = cell_dofs(TV)
     TV_dof = DegreeOfFreedom(TV)
 
-    dmap = V.dofmap()
+    dmap = cell_dofs(V)
     V_basis_f = FEBasisFunction(V)
 
     # Rows
@@ -97,14 +106,14 @@ def trace_mat_no_restrict(V, TV, trace_mesh=None):
 
         for trace_cell in range(TV.mesh().num_cells()):
             TV_dof.cell = trace_cell
-            trace_dofs = Tdmap.cell_dofs(trace_cell)
+            trace_dofs = Tdmap[trace_cell]
 
             # Figure out the dofs of V to use here. Does not matter which
             # cell of the connected ones we pick
             cell = f2c(mapping[trace_cell])[0]
             V_basis_f.cell = cell
             
-            dofs = dmap.cell_dofs(cell)
+            dofs = dmap[cell]
             for local_T, dof_T in enumerate(trace_dofs):
 
                 if visited_dofs[dof_T]:
@@ -116,16 +125,18 @@ def trace_mat_no_restrict(V, TV, trace_mesh=None):
                 TV_dof.dof = local_T
                 
                 # Eval at V basis functions
-                for local, dof in enumerate(dofs):
-                    # Set which basis foo
-                    V_basis_f.dof = local
+                with step('basis evaluation'):
+                    for local, dof in enumerate(dofs):
+                        # Set which basis foo
+                        V_basis_f.dof = local
                     
-                    dof_values[local] = TV_dof.eval(V_basis_f)
+                        dof_values[local] = TV_dof.eval(V_basis_f)
 
                 # Can fill the matrix now
                 col_indices = np.array(dofs, dtype='int32')
                 # Insert
-                mat.setValues([dof_T], col_indices, dof_values, PETSc.InsertMode.INSERT_VALUES)
+                with step('matrix insertion'):
+                    mat.setValues([dof_T], col_indices, dof_values, PETSc.InsertMode.INSERT_VALUES)
     return mat
 
 
@@ -150,10 +161,10 @@ def trace_mat_one_restrict(V, TV, restriction, normal, trace_mesh=None):
 
     # The idea is to evaluate TV's degrees of freedom at basis functions
     # of V
-    Tdmap = TV.dofmap()
+    Tdmap = cell_dofs(TV)
     TV_dof = DegreeOfFreedom(TV)
 
-    dmap = V.dofmap()
+    dmap = cell_dofs(V)
     V_basis_f = FEBasisFunction(V)
 
     gdim = mesh.geometry().dim()
@@ -165,7 +176,7 @@ def trace_mat_one_restrict(V, TV, restriction, normal, trace_mesh=None):
 
         for trace_cell in range(trace_mesh.num_cells()):
             TV_dof.cell = trace_cell
-            trace_dofs = Tdmap.cell_dofs(trace_cell)
+            trace_dofs = Tdmap[trace_cell]
 
             # Figure out the dofs of V to use here
             facet_cells = f2c(mapping[trace_cell])
@@ -186,7 +197,7 @@ def trace_mat_one_restrict(V, TV, restriction, normal, trace_mesh=None):
                 cell = facet_cells[signs.index(restriction)]
             V_basis_f.cell = cell
             
-            dofs = dmap.cell_dofs(cell)
+            dofs = dmap[cell]
             for local_T, dof_T in enumerate(trace_dofs):
 
                 if visited_dofs[dof_T]:
@@ -198,16 +209,18 @@ def trace_mat_one_restrict(V, TV, restriction, normal, trace_mesh=None):
                 TV_dof.dof = local_T
                 
                 # Eval at V basis functions
-                for local, dof in enumerate(dofs):
-                    # Set which basis foo
-                    V_basis_f.dof = local
+                with step('basis evaluation'):
+                    for local, dof in enumerate(dofs):
+                        # Set which basis foo
+                        V_basis_f.dof = local
                     
-                    dof_values[local] = TV_dof.eval(V_basis_f)
+                        dof_values[local] = TV_dof.eval(V_basis_f)
 
                 # Can fill the matrix now
                 col_indices = np.array(dofs, dtype='int32')
                 # Insert
-                mat.setValues([dof_T], col_indices, dof_values, PETSc.InsertMode.INSERT_VALUES)
+                with step('matrix insertion'):
+                    mat.setValues([dof_T], col_indices, dof_values, PETSc.InsertMode.INSERT_VALUES)
     return mat
 
 
@@ -232,10 +245,10 @@ def trace_mat_two_restrict(V, TV, restriction, normal, trace_mesh=None):
 
     # The idea is to evaluate TV's degrees of freedom at basis functions
     # of V
-    Tdmap = TV.dofmap()
+    Tdmap = cell_dofs(TV)
     TV_dof = DegreeOfFreedom(TV)
 
-    dmap = V.dofmap()
+    dmap = cell_dofs(V)
     V_basis_f = FEBasisFunction(V)
 
     # We define avg as sum(+, -)/2 and jump as sum(+, neg(-))
@@ -251,7 +264,7 @@ def trace_mat_two_restrict(V, TV, restriction, normal, trace_mesh=None):
 
         for trace_cell in range(trace_mesh.num_cells()):
             TV_dof.cell = trace_cell
-            trace_dofs = Tdmap.cell_dofs(trace_cell)
+            trace_dofs = Tdmap[trace_cell]
 
             # Figure out the dofs of V to use here
             facet_cells = f2c(mapping[trace_cell])
@@ -289,23 +302,25 @@ def trace_mat_two_restrict(V, TV, restriction, normal, trace_mesh=None):
                 ADD_VALUES = False
                 for modify, cell in zip(modifiers, facet_cells):
                     V_basis_f.cell = cell
-                    dofs = dmap.cell_dofs(cell)
+                    dofs = dmap[cell]
 
                     # Eval at V basis functions
-                    for local, dof in enumerate(dofs):
-                        # Set which basis foo
-                        V_basis_f.dof = local
-                        dof_values[local] = modify(TV_dof.eval(V_basis_f))
+                    with step('basis evaluation'):
+                        for local, dof in enumerate(dofs):
+                            # Set which basis foo
+                            V_basis_f.dof = local
+                            dof_values[local] = modify(TV_dof.eval(V_basis_f))
                     # Can fill the matrix now
                     col_indices = np.array(dofs, dtype='int32')
 
-                    if not ADD_VALUES:
-                        mat.setValues([dof_T], col_indices, dof_values, PETSc.InsertMode.INSERT_VALUES)
-                        ADD_VALUES = True
-                        #print 'setting', dof_T, col_indices, dof_values
-                    else:
-                        mat.setValues([dof_T], col_indices, dof_values, PETSc.InsertMode.ADD_VALUES)
-                        #print 'adding', dof_T, col_indices, dof_values
+                    with step('matrix insertion'):
+                        if not ADD_VALUES:
+                            mat.setValues([dof_T], col_indices, dof_values, PETSc.InsertMode.INSERT_VALUES)
+                            ADD_VALUES = True
+                            #print 'setting', dof_T, col_indices, dof_values
+                        else:
+                            mat.setValues([dof_T], col_indices, dof_values, PETSc.InsertMode.ADD_VALUES)
+                            #print 'adding', dof_T, col_indices, dof_values
     return mat
 
 
@@ -321,13 +336,15 @@ def get_entity_map(mesh, trace_mesh):
         # Check if we have the map embedding into mesh
         if mesh_id not in trace_mesh.parent_entity_map:
             info('\tMissing map for mesh %d' % mesh_id)
-            parent_entity_map = build_embedding_map(trace_mesh, mesh)
+            with phase('point location'):
+                parent_entity_map = build_embedding_map(trace_mesh, mesh)
             trace_mesh.parent_entity_map[mesh_id] = parent_entity_map
     # Compute from scratch and rememeber for future
     else:
         info('\tComputing embedding map for mesh %d' % mesh_id)
 
-        parent_entity_map = build_embedding_map(trace_mesh, mesh)
+        with phase('point location'):
+            parent_entity_map = build_embedding_map(trace_mesh, mesh)
         # If success we attach it to the mesh (to prevent future recomputing)
         trace_mesh.parent_entity_map = {mesh_id: parent_entity_map}
     return True
@@ -69,9 +69,9 @@ def matches(expr, target, attributes=None):
         return is_equal_terminal(expr, target, attributes)
     # Not terminal need to agree on type and have the same argument
     if not is_terminal(expr) and not is_terminal(target):
-        return all((isinstance(expr, type(target)),
-                    all(matches(*ops, attributes=None)
-                        for ops in zip(expr.ufl_operands, target.ufl_operands))))
+        return (isinstance(expr, type(target)) and
+                all(matches(*ops, attributes=None)
+                    for ops in zip(expr.ufl_operands, target.ufl_operands)))
     return False
 
                                                               
@@ -97,15 +97,37 @@ def contains(expr, target, attributes=None):
 
 def replace(expr, arg, replacement, attributes=None):
     '''Replace and argument in the expression by the replacement'''
-    # Do nothing if no way to substitute, i.e. return original
-    if not contains(expr, arg, attributes):
-        return expr
-    # Identical 
-    if matches(expr, arg, attributes):
-        return replacement
-
-    # Reconstruct the node with the substituted argument
-    return type(expr)(*[replace(op, arg, replacement, attributes) for op in expr.ufl_operands])
+    # The expression is a DAG; every unique node (by identity, ufl equality
+    # would ignore the attributes) is visited once in post-order and nodes
+    # whose operands did not change are returned as they are
+    new = {}
+    stack = [expr]
+    while stack:
+        node = stack[-1]
+        if id(node) in new:
+            stack.pop()
+            continue
+        
+        if matches(node, arg, attributes):
+            new[id(node)] = replacement
+        elif is_terminal(node):
+            new[id(node)] = node
+        else:
+            pending = [op for op in node.ufl_operands if id(op) not in new]
+            # Children first
+            if pending:
+                stack.extend(pending)
+                continue
+
+            ops = [new[id(op)] for op in node.ufl_operands]
+            if all(op is old for op, old in zip(ops, node.ufl_operands)):
+                new[id(node)] = node
+            else:
+                # Reconstruct the node with the substituted argument
+                new[id(node)] = type(node)(*ops)
+        stack.pop()
+
+    return new[id(expr)]
 
 
 def is_trial_function(v):
@@ -2,19 +2,33 @@ import xii.assembler.trace_assembly
 import xii.assembler.average_assembly
 import xii.assembler.restriction_assembly
 import xii.assembler.extension_assembly
+from xii.assembler import form_cache
+from xii.profiling import phase, traced, describe, cache_access
 
-from xii.linalg.matrix_utils import is_number
+from xii.linalg.matrix_utils import is_number, is_petsc_vec, as_petsc
+from xii.linalg.convert import collapse as collapse_tensor
 from xii.assembler.ufl_utils import form_arity
 from xii.linalg.list_utils import shape_list, reshape_list, flatten_list
 
+from multiprocessing import Pool
+from petsc4py import PETSc
 from block import block_vec, block_mat
 from ufl.form import Form
 import dolfin as df
 import numpy as np
+import itertools
 
 
-def assemble(form):
-    '''Assemble multidimensional form'''
+@traced('ii_assemble')
+def assemble(form, cache=True, workers=1, collapse=False):
+    '''
+    Assemble multidimensional form. With cache reduced forms whose 
+    coefficients did not change since last assembly are not reassembled.
+    With workers > 1 the blocks are assembled concurrently by a pool of 
+    (forked) processes; the blocks are then matrices/vectors as with 
+    collapse and the caches of this process are not filled. With collapse the reduced bilinear forms are single matrices 
+    (T^T*A*T computed by PETSc) instead of cbc.block expressions.
+    '''
     # In the base case we want to fall trough the custom assemblers
     # for trace/average/restriction problems until something that 
     # dolfin can handle (hopefully)
@@ -26,20 +40,112 @@ def assemble(form):
     names = ('trace', 'average', 'extension', 'restriction')
     
     if isinstance(form, Form):
+        with phase('ufl processing'):
+            key = form_cache.form_key(form, collapse) if cache else None
+        if key is not None:
+            tensor = form_cache.lookup(key)
+            cache_access('form cache', tensor is not None)
+            if tensor is not None:
+                return tensor
+
         arity = form_arity(form)
         # Try with our reduced assemblers
         for name, module in zip(names, modules):
-            tensor = module.assemble_form(form, arity)
+            tensor = module.assemble_form(form, arity, collapse, cache)
             if tensor is not None:
+                if key is not None:
+                    tensor = form_cache.store(key, form, tensor)
                 return tensor
         # Fallback
-        return df.assemble(form)
+        with phase('ffc assembly'):
+            tensor = df.assemble(form)
+        describe('ffc assembly', tensor)
+        return tensor
 
     # We might get number
     if is_number(form): return form
 
     shape = shape_list(form)
+    forms = flatten_list(form)
+    # For profiling
+    labels = ['block %s' % (index, ) for index in itertools.product(*map(range, shape))]
+
+    def assemble_block((label, f)):
+        with phase(label):
+            return assemble(f, cache, 1, collapse)
     # Recurse
-    blocks = reshape_list(map(assemble, flatten_list(form)), shape)
+    if workers > 1 and len(forms) > 1:
+        tensors = assemble_forked(forms, cache, min(workers, len(forms)))
+    else:
+        tensors = map(assemble_block, zip(labels, forms))
+    blocks = reshape_list(tensors, shape)
     
     return (block_vec if len(shape) == 1 else block_mat)(blocks)
+
+
+# Dolfin holds the GIL (and is not thread safe) so concurrent assembly
+# needs processes. The forms do not pickle; instead the forked children
+# find them in _forked (inherited memory) and send back the assembled
+# blocks as arrays (CSR for matrices). NOTE: serial only.
+_forked = []
+
+
+def assemble_child(i):
+    '''Arrays of the i-th form of _forked assembled collapsed'''
+    form, cache = _forked[i]
+    tensor = assemble(form, cache, 1, True)
+    if is_number(tensor):
+        return tensor
+
+    if not is_petsc_vec(tensor) and not isinstance(tensor, df.GenericMatrix):
+        tensor = collapse_tensor(tensor)
+    if is_petsc_vec(tensor):
+        return tensor.get_local()
+
+    mat = as_petsc(tensor)
+    return (mat.getSize(), mat.getValuesCSR())
+
+
+def from_arrays(data):
+    '''Tensor from the arrays of assemble_child'''
+    if is_number(data):
+        return data
+
+    if isinstance(data, np.ndarray):
+        vec = PETSc.Vec().createSeq(len(data))
+        vec.setArray(data)
+        return df.PETScVector(vec)
+
+    size, csr = data
+    mat = PETSc.Mat().createAIJ(size=size, csr=csr, comm=PETSc.COMM_SELF)
+    mat.assemble()
+    return df.PETScMatrix(mat)
+
+
+def prepare(form):
+    '''Build the reduction operators of the form and compile its plain forms'''
+    from xii.assembler.assembly_plan import reduced_terms
+
+    if is_number(form): return
+    for _, plain, _, _ in reduced_terms(form):
+        df.Form(plain)
+
+
+def assemble_forked(forms, cache, workers):
+    '''Assemble forms by a pool of workers processes'''
+    global _forked
+    # What the blocks share (reduced spaces and operators, compiled forms)
+    # is built once here and inherited by the children
+    with phase('fork setup'):
+        for f in forms:
+            prepare(f)
+    # Set before the fork so that the children have it
+    _forked = [(f, cache) for f in forms]
+    pool = Pool(workers)
+    try:
+        data = pool.map(assemble_child, range(len(forms)))
+    finally:
+        pool.close()
+        pool.join()
+        _forked = []
+    return map(from_arrays, data)
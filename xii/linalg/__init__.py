@@ -4,11 +4,15 @@ from . convert import set_lg_map
 from . block_utils import (block_diag_mat, ii_PETScOperator, ii_PETScPreconditioner,
                            VectorizedOperator, ReductionOperator, BlockPC)
 from . function import ii_Function, as_petsc_nest
-from . bc_apply import apply_bc
+from . bc_apply import apply_bc, BlockBCApplier
+from . fieldsplit import block_index_sets, setup_fieldsplit
+from . fractional import FractionalOperator, rational_inverse
 
-try:
-    from . hsmg_utils import inverse
-except ImportError:
-    print 'Missing HsMG for fract norm computing'
-    pass
 
+def inverse(bmat, cache_dir=None):
+    '''Inverse of a linear combination of Hs norms (HsMG is loaded here)'''
+    try:
+        from . hsmg_utils import inverse as hs_inverse
+    except ImportError:
+        raise ImportError('Missing HsMG for fract norm computing')
+    return hs_inverse(bmat, cache_dir)
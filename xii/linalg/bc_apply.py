@@ -3,108 +3,148 @@ from block import block_bc, block_assemble
 from dolfin import *
 
 from xii.linalg.convert import convert 
-from xii.linalg.convert import numpy_to_petsc
-from scipy.sparse import csr_matrix
 from block import block_mat, block_vec
 from petsc4py import PETSc
 import numpy as np
 
 
-def apply_bc(A, b, bcs):
-    '''
-    Apply block boundary conditions to block system A, b    
-    '''
-    # Allow for A, b be simple matrices. To proceed we wrap them as
-    # block objects
-    has_wrapped_A = False
-    if not isinstance(A, block_mat):
-        A = block_mat([[A]])
-        has_wrapped_A = True
-    
-    if not isinstance(b, block_vec):
-        assert has_wrapped_A
-        b = block_vec([b])
-        bcs = [bcs]
-
-    # block boundary conditions is a list with bcs for each block of A, b
-    assert len(A) == len(b) == len(bcs)
-
-    bcs_ = []
+def boundary_values(bcs):
+    '''Dofs (sorted) and values of bcs (list of DirichletBC or dicts)'''
+    values = {}
     for bc in bcs:
-        assert isinstance(bc, (DirichletBC, list))
-        if isinstance(bc, DirichletBC):
-            bcs_.append([bc])
-        else:
-            bcs_.append(bc)
-    bcs = bcs_
-
-    # Obtain a monolithic matrix
-    AA, bb = map(convert, (A, b))
-    # PETSc guys
-    AA, bb = as_backend_type(AA).mat(), as_backend_type(bb).vec()
-
-    # We want to make a monotlithic matrix corresponding to function sp ace
-    # where the spaces are serialized
-    
-    # Break apart for block
-    offsets = [0]
-    for bi in b:
-        offsets.append(offsets[-1] + bi.size())
-
-    rows = []
-    x_values = []
-    # Each bc in the group has dofs numbered only wrt to its space.
-    # We're after global numbering
-    for shift, bcs_sub in zip(offsets, bcs): 
-        for bc in bcs_sub:
-            # NOTE: bcs can be a dict or DirichletBC in which case we extract
-            # the dict
-            if isinstance(bc, DirichletBC): bc = bc.get_boundary_values()
-            # Dofs and values for rhs
-            rows.extend(shift + np.array(bc.keys(), dtype='int32'))
-            x_values.extend(bc.values())
-            
-    rows = np.hstack(rows)
-    x_values = np.array(x_values)
-
-    x = bb.copy()
-    x.zeroEntries()
-    x.setValues(rows, x_values)
+        # NOTE: bcs can be a dict or DirichletBC in which case we extract
+        # the dict
+        if isinstance(bc, DirichletBC): bc = bc.get_boundary_values()
+        values.update(bc)
 
-    # Apply to monolithic
-    len(rows) and AA.zeroRowsColumns(rows, diag=1., x=x, b=bb)
+    dofs = np.array(sorted(values.keys()), dtype=PETSc.IntType)
+    return dofs, np.array([values[dof] for dof in dofs], dtype=float)
 
-    blocks = []
-    for first, last in zip(offsets[:-1], offsets[1:]):
-        blocks.append(PETSc.IS().createStride(last-first, first, 1))
 
-    # Reasamble
-    comm = mpi_comm_world()
-    b = [PETSc.Vec().createWithArray(bb.getValues(block), comm=comm) for block in blocks]
-    for bi in b:
-        bi.assemblyBegin()
-        bi.assemblyEnd()
-    b = block_vec(map(PETScVector, b))
-
-    # PETSc 3.7.x
+def submatrix(A, rows, cols):
+    '''PETSc A[rows, cols]'''
     try:
-        AA.getSubMatrix
-        A = [[PETScMatrix(AA.getSubMatrix(block_row, block_col)) for block_col in blocks]
-             for block_row in blocks]
-    # NOTE: 3.8+ does not ahve getSubMatrix, there is getLocalSubMatrix
-    # but cannot get that to work - petsc error 73. So for now everything
-    # is done with scipy    
+        return A.createSubMatrix(rows, cols)
+    # PETSc 3.7.x
     except AttributeError:
-        AA = csr_matrix(AA.getValuesCSR()[::-1], shape=AA.size)
+        return A.getSubMatrix(rows, cols)
 
-        A = [[numpy_to_petsc(AA[block_row.array, :][:, block_col.array]) for block_col in blocks]
-             for block_row in blocks]
-    # Block mat
-    A = block_mat(A)
 
-    if has_wrapped_A: return A[0][0], b[0]
-    
-    return A, b
+class BlockBCApplier(object):
+    '''
+    Symmetric elimination of block boundary conditions in the system with
+    matrix A (and dofs of bcs) which does not change. The matrix is
+    modified (in place) once here: the rows and columns of bc dofs are 
+    zeroed, diagonal of the diagonal blocks is diag_val. What remains for
+    right hand sides b is lifting by the columns of A at bc dofs (kept as
+    matrices) and setting the bc values.
+    '''
+    def __init__(self, A, bcs, diag_val=1.):
+        # Allow for A be simple matrix. To proceed we wrap it as block object
+        self.is_block = isinstance(A, block_mat)
+        if not self.is_block:
+            A, bcs = block_mat([[A]]), [bcs]
+        # block boundary conditions is a list with bcs for each block of A
+        assert len(A) == len(bcs)
+
+        self.bcs = []
+        for bc in bcs:
+            assert isinstance(bc, (DirichletBC, list))
+            self.bcs.append([bc] if isinstance(bc, DirichletBC) else bc)
+        self.diag_val = diag_val
+
+        # Every block is a matrix (the matrix blocks of A are kept)
+        A = convert(A, algorithm=None)
+        # which is modified so it cannot be shared by blocks
+        seen = set()
+        for index, Aij in np.ndenumerate(A.blocks):
+            handle = as_backend_type(Aij).mat().handle
+            if handle in seen:
+                A.blocks[index] = PETScMatrix(as_backend_type(Aij).mat().copy())
+            seen.add(handle)
+
+        # Dofs are numbered wrt to the space of the block
+        self.dofs, values = zip(*map(boundary_values, self.bcs))
+        # Vecs share the arrays
+        self.values = list(values)
+        self.value_vecs = [PETSc.Vec().createWithArray(v) for v in self.values]
+
+        n = len(self.dofs)
+        # Lifting b_i -= A_ij[:, dofs_j]*values_j is done by multAdd
+        self.lifting = [[None]*n for _ in range(n)]
+        for i in range(n):
+            for j in range(n):
+                if not len(self.dofs[j]): continue
+
+                Aij = as_backend_type(A[i][j]).mat()
+                rows = PETSc.IS().createStride(Aij.getSize()[0], 0, 1)
+                cols = PETSc.IS().createGeneral(self.dofs[j])
+                L = submatrix(Aij, rows, cols)
+                L.scale(-1.)
+                self.lifting[i][j] = L
+
+        # Zero rows and columns
+        for i in range(n):
+            for j in range(n):
+                if not (len(self.dofs[i]) or len(self.dofs[j])): continue
+
+                Aij = as_backend_type(A[i][j]).mat()
+                # Products of reduced assembly are refilled with the same pattern
+                Aij.setOption(PETSc.Mat.Option.KEEP_NONZERO_PATTERN, True)
+                if i == j:
+                    Aij.zeroRowsColumns(self.dofs[i], diag=diag_val)
+                else:
+                    Aij.diagonalScale(self.mask(i, Aij.createVecLeft()) if len(self.dofs[i]) else None,
+                                      self.mask(j, Aij.createVecRight()) if len(self.dofs[j]) else None)
+                    
+        self.A = A if self.is_block else A[0][0]
+
+    def mask(self, i, mask):
+        '''mask (of block i layout) is 0 at bc dofs and 1 elsewhere'''
+        mask.set(1.)
+        mask.setValues(self.dofs[i], np.zeros(len(self.dofs[i])))
+        mask.assemble()
+        return mask
+
+    def update_values(self):
+        '''Bc values (at the same dofs) are read again from the bcs'''
+        for bcs, dofs, values in zip(self.bcs, self.dofs, self.values):
+            dofs_, values_ = boundary_values(bcs)
+            assert len(dofs_) == len(dofs) and np.all(dofs_ == dofs)
+            # Vecs share the memory
+            values[:] = values_
+
+    def apply(self, b):
+        '''Lift b and set the bc values in it (in place)'''
+        blocks = b if self.is_block else [b]
+        assert len(blocks) == len(self.dofs)
+        
+        for i, bi in enumerate(blocks):
+            bi_ = as_backend_type(bi).vec()
+            for L, values in zip(self.lifting[i], self.value_vecs):
+                if L is not None: L.multAdd(values, bi_, bi_)
+            bi_.setValues(self.dofs[i], self.diag_val*self.values[i])
+            bi_.assemble()
+        return b
+
+
+def apply_bc(A, b, bcs, diag_val=1.):
+    '''
+    Apply block boundary conditions to block system A, b. This is done
+    in place (on the PETSc matrices and vectors of the blocks) and like
+    PETSc's zeroRowsColumns: the rows and columns of bc dofs are zeroed
+    (diagonal of diagonal blocks is diag_val) and b is lifted by the bc 
+    values. Blocks which are numbers or expressions become matrices.
+    For many right hand sides use BlockBCApplier.
+    '''
+    # Allow for A, b be simple matrices
+    if not isinstance(b, block_vec):
+        assert not isinstance(A, block_mat)
+    else:
+        assert len(A) == len(b)
+        
+    applier = BlockBCApplier(A, bcs, diag_val)
+    return applier.A, applier.apply(b)
 
 
 def identity(ncells):
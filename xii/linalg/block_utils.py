@@ -2,15 +2,15 @@ from block.block_base import block_base
 from block.object_pool import vec_pool
 from block import block_transpose
 
-from xii.linalg.convert import bmat_sizes, get_dims
-from xii.linalg.function import as_petsc_nest
-from xii.linalg.matrix_utils import as_petsc
+from xii.linalg.convert import bmat_sizes, get_dims, collapse, collapse_blocks
+from xii.linalg.matrix_utils import as_petsc, is_number, is_petsc_mat, diagonal_matrix, zero_matrix
 
 from block import block_mat, block_vec
 from dolfin import (PETScVector, as_backend_type, Function, Vector, GenericVector,
-                    mpi_comm_world, Matrix, PETScMatrix)
+                    mpi_comm_world, warning)
 from petsc4py import PETSc
 import numpy as np
+import threading
 
 
 def block_diag_mat(diagonal):
@@ -22,8 +22,161 @@ def block_diag_mat(diagonal):
     return block_mat(blocks)
 
 
-def ii_PETScOperator(bmat):
-    '''Return an object with mult method which acts like bmat*'''
+def petsc_nest_operator(bmat):
+    '''
+    PETSc MatNest (Mat for single block) with collapsed blocks of bmat. 
+    None if some block cannot be collapsed.
+    '''
+    if not isinstance(bmat, block_base):
+        try:
+            A = collapse(bmat)
+        except ValueError:
+            return None
+        return as_petsc(A) if is_petsc_mat(A) else None
+
+    try:
+        row_sizes, col_sizes = bmat_sizes(bmat)
+        blocks = collapse_blocks(bmat.blocks.flatten())
+    except ValueError:
+        return None
+
+    nrows, ncols = len(row_sizes), len(col_sizes)
+    nest = [[None]*ncols for _ in range(nrows)]
+    for k, A in enumerate(blocks):
+        i, j = divmod(k, ncols)
+        if is_number(A):
+            # Zero blocks are left out of the nest
+            if A == 0: continue
+            # Multiples of identity
+            if i != j or row_sizes[i] is None or row_sizes[i] != col_sizes[j]:
+                return None
+            A = diagonal_matrix(row_sizes[i], A)
+        elif not is_petsc_mat(A):
+            return None
+        nest[i][j] = as_petsc(A)
+    # Still, createNest gets the sizes of a row/column from its blocks so
+    # each needs one. Zero row (column) of a square system has the size of
+    # the column (row)
+    if nrows == ncols:
+        row_sizes = [r if r is not None else c for r, c in zip(row_sizes, col_sizes)]
+        col_sizes = [c if c is not None else r for r, c in zip(row_sizes, col_sizes)]
+
+    for i in range(nrows):
+        if all(A is None for A in nest[i]):
+            j = i if i < ncols else 0
+            if row_sizes[i] is None or col_sizes[j] is None:
+                return None
+            nest[i][j] = as_petsc(zero_matrix(row_sizes[i], col_sizes[j]))
+
+    for j in range(ncols):
+        if all(nest[i][j] is None for i in range(nrows)):
+            i = j if j < nrows else 0
+            if row_sizes[i] is None or col_sizes[j] is None:
+                return None
+            nest[i][j] = as_petsc(zero_matrix(row_sizes[i], col_sizes[j]))
+
+    mat = PETSc.Mat().createNest(nest)
+    mat.assemble()
+
+    return mat
+
+
+def petsc_vec(v):
+    '''PETSc Vec of the dolfin vector'''
+    return as_backend_type(v).vec()
+
+
+def assign(y, x):
+    '''Copy values of x to y; (block) vectors with the same layout'''
+    if isinstance(y, block_vec):
+        for yi, xi in zip(y, x):
+            assign(yi, xi)
+    else:
+        petsc_vec(x).copy(petsc_vec(y))
+    return y
+
+
+def apply_operator(A, x, y, transpose=False):
+    '''
+    y = A*x (A.T*x with transpose) overwriting y. Matrices, xii operators
+    and block_mats of matrices/numbers do it in place; other operators
+    (expressions) allocate their result which is then copied to y.
+    '''
+    if isinstance(A, block_transpose):
+        return apply_operator(A.A, x, y, not transpose)
+
+    if isinstance(A, WorkOperator):
+        return A.apply_transpose(x, out=y) if transpose else A.apply(x, out=y)
+
+    if is_number(A):
+        assign(y, x)
+        petsc_vec(y).scale(A)
+        return y
+        
+    if is_petsc_mat(A):
+        A_ = as_petsc(A)
+        (A_.multTranspose if transpose else A_.mult)(petsc_vec(x), petsc_vec(y))
+        return y
+
+    if isinstance(A, block_mat) and not any(isinstance(v, block_vec) for v in list(x) + list(y)):
+        blocks = A.blocks.T if transpose else A.blocks
+        for yi, row in zip(y, blocks):
+            yi_ = petsc_vec(yi)
+            yi_.zeroEntries()
+            for xj, Aij in zip(x, row):
+                if is_number(Aij):
+                    if Aij != 0: yi_.axpy(Aij, petsc_vec(xj))
+                elif is_petsc_mat(Aij):
+                    Aij_ = as_petsc(Aij)
+                    (Aij_.multTransposeAdd if transpose else Aij_.multAdd)(petsc_vec(xj), yi_, yi_)
+                else:
+                    yi_.axpy(1., petsc_vec((block_transpose(Aij) if transpose else Aij)*xj))
+        return y
+
+    return assign(y, (block_transpose(A) if transpose else A)*x)
+
+
+class VecViews(object):
+    '''
+    dolfin vector (block_vec for nested) sharing the values of PETSc Vec.
+    KSP passes to mult/apply only few different Vecs so the views are kept.
+    With is_block None nested are the Vecs of type nest.
+    '''
+    size = 32
+    
+    def __init__(self, is_block):
+        self.is_block = is_block
+        self.views = {}
+
+    def __call__(self, vec):
+        if vec.handle not in self.views:
+            if len(self.views) == VecViews.size: self.views.clear()
+            
+            is_block = self.is_block
+            if is_block is None:
+                is_block = vec.getType() == PETSc.Vec.Type.NEST
+
+            if is_block:
+                view = block_vec(map(PETScVector, vec.getNestSubVecs()))
+            else:
+                view = PETScVector(vec)
+            # With the vec alive its handle is not reused
+            self.views[vec.handle] = (vec, view)
+        return self.views[vec.handle][1]
+
+    
+def ii_PETScOperator(bmat, native=False):
+    '''
+    Return an object with mult method which acts like bmat*. With native 
+    the result is PETSc MatNest of collapsed blocks (so PETSc does the 
+    mult without calling python). When the blocks cannot be collapsed we 
+    fall back to python shell.
+    '''
+    if native:
+        mat = petsc_nest_operator(bmat)
+        if mat is not None:
+            return mat
+        warning('Falling back to python shell for the operator')
 
     if isinstance(bmat, block_base):
         row_sizes, col_sizes = bmat_sizes(bmat)
@@ -35,48 +188,18 @@ def ii_PETScOperator(bmat):
     class Foo(object):
         def __init__(self, A):
             self.A = A
+            # Action of transpose by blocks' transpmult
+            self.AT = block_transpose(A)
+            # x, y are nested vectors for block
+            self.views = VecViews(is_block)
 
-        if is_block:
-            def mult(self, mat, x, y):
-                '''y = A*x'''
-                y *= 0
-                # Now x shall be comming as a nested vector
-                # Convert
-                x_bvec = block_vec(map(PETScVector, x.getNestSubVecs()))
-                # Apply
-                y_bvec = self.A*x_bvec
-                # Convert back
-                y.axpy(1., as_petsc_nest(y_bvec))
-
-            def multTranspose(self, mat, x, y):
-                '''y = A.T*x'''
-                AT = block_transpose(self.A)
-            
-                y *= 0
-                # Now x shall be comming as a nested vector
-                # Convert
-                x_bvec = block_vec(map(PETScVector, x.getNestSubVecs()))
-                # Apply
-                y_bvec = AT*x_bvec
-                # Convert back
-                y.axpy(1., as_petsc_nest(y_bvec))
-        # No block
-        else:
-            def mult(self, mat, x, y):
-                '''y = A*x'''
-                y *= 0
-                x_bvec = PETScVector(x)
-                y_bvec = self.A*x_bvec
-                y.axpy(1., as_petsc(y_bvec))
-
-            def multTranspose(self, mat, x, y):
-                '''y = A.T*x'''
-                AT = block_transpose(self.A)
-            
-                y *= 0
-                x_bvec = PETScVector(x)
-                y_bvec = AT*x_bvec
-                y.axpy(1., as_petsc(y_bvec))
+        def mult(self, mat, x, y):
+            '''y = A*x'''
+            apply_operator(self.A, self.views(x), self.views(y))
+
+        def multTranspose(self, mat, x, y):
+            '''y = A.T*x'''
+            apply_operator(self.AT, self.views(x), self.views(y))
 
     mat = PETSc.Mat().createPython([[sum(row_sizes), ]*2, [sum(col_sizes), ]*2])
     mat.setPythonContext(Foo(bmat))
@@ -87,63 +210,25 @@ def ii_PETScOperator(bmat):
 
 def ii_PETScPreconditioner(bmat, ksp):
     '''Create from bmat a preconditioner for KSP'''
-    # try:
-    #     row_sizes, col_sizes = bmat_sizes(bmat)
-    #     is_block = True
-    # except ValueError:
-    #     nrows, ncols = get_dims(bmat)
-    #     row_sizes, col_sizes = (nrows, ), (ncols, )
-    #     is_block = False
-    is_block = not isinstance(bmat, (Matrix, PETScMatrix))
+    # Operators which are not matrices (e.g. hs_inverse) can be single
+    # blocks too so we go by the vectors KSP gives us
+    is_block = None
     # NOTE: we assume that this is a symmetric operator
     class Foo(object):
         def __init__(self, A):
             self.A = A
+            # Action of transpose by blocks' transpmult
+            self.AT = block_transpose(A)
+            # x, y are nested vectors for block
+            self.views = VecViews(is_block)
 
-        if is_block:
-            def apply(self, mat, x, y):
-                '''y = A*x'''
-                # Now x shall be comming as a nested vector
-                y *= 0
-                # Now x shall be comming as a nested vector
-                # Convert
-                x_bvec = block_vec(map(PETScVector, x.getNestSubVecs()))
-                # Apply
-                y_bvec = self.A*x_bvec
-                # Convert back
-                y.axpy(1., as_petsc_nest(y_bvec))
-            
-            def applyTranspose(self, mat, x, y):
-                '''y = A.T*x'''
-                AT = block_transpose(self.A)
-                
-                # Now x shall be comming as a nested vector
-                y *= 0
-                # Now x shall be comming as a nested vector
-                # Convert
-                x_bvec = block_vec(map(PETScVector, x.getNestSubVecs()))
-                # Apply
-                y_bvec = AT*x_bvec
-                # Convert back
-                y.axpy(1., as_petsc_nest(y_bvec))
-        # no block; FIXME: would be so much simpler with type dispatch
-        # Ie block_vec knows what to do + wrap x.getNestSubVecs
-        else:
-            def apply(self, mat, x, y):
-                '''y = A*x'''
-                y *= 0
-                x_bvec = PETScVector(x)
-                y_bvec = self.A*x_bvec
-                y.axpy(1., as_petsc(y_bvec))
-
-            def applyTranspose(self, mat, x, y):
-                '''y = A.T*x'''
-                AT = block_transpose(self.A)
-                
-                y *= 0
-                x_bvec = PETScVector(x)
-                y_bvec = AT*x_bvec
-                y.axpy(1., as_petsc(y_bvec))
+        def apply(self, mat, x, y):
+            '''y = A*x'''
+            apply_operator(self.A, self.views(x), self.views(y))
+
+        def applyTranspose(self, mat, x, y):
+            '''y = A.T*x'''
+            apply_operator(self.AT, self.views(x), self.views(y))
 
     pc = ksp.pc
     pc.setType(PETSc.PC.Type.PYTHON)
@@ -153,13 +238,39 @@ def ii_PETScPreconditioner(bmat, ksp):
     return pc
 
 
-class VectorizedOperator(block_base):
+class WorkOperator(block_base):
+    '''
+    Operator with in place actions apply(x, out=y) and apply_transpose.
+    Without out the result is a (pooled) vector of create_vec. The work
+    vectors and scatters needed by the actions are made on first use and
+    then kept by the operator.
+    '''
+    def matvec(self, b):
+        return self.apply(b)
+
+    def transpmult(self, b):
+        return self.apply_transpose(b)
+
+    def work(self, key, create):
+        '''Object key of the pool; create() makes it if missing'''
+        pool = self.__dict__.setdefault('pool', {})
+        if key not in pool:
+            pool[key] = create()
+        return pool[key]
+
+    
+class VectorizedOperator(WorkOperator):
     '''
     Suppose W is V x V x ... x V and bmat is an operator on V. Here we 
     represent an action of a diagonal operator where each diagonal block 
-    is bmat.
+    is bmat. Batched, the components of vector in W are gathered into 
+    dense multivector X (column per component) and the action is a single 
+    A*X. This is done if bmat is a matrix (MatMatMult) or has a method 
+    matmat (action on (n, ncomps) array, e.g. dense/factored operator).
+    The transpose is batched with matrices and operators with rmatmat
+    (action of the transpose on array).
     '''
-    def __init__(self, bmat, W):
+    def __init__(self, bmat, W, batched=True):
         # Really V X V ... nicely serialized
         self.bmat = bmat
         self.W = W
@@ -169,14 +280,12 @@ class VectorizedOperator(block_base):
             size,  = set(Wi.dim() for Wi in W)
 
             # Matches A
-            n, n = get_dims(bmat)
+            n, m = get_dims(bmat)
             assert n == m == size
 
-            A = block_diag_mat([bmat]*len(W))
-
-            self.__matvec__ = lambda self, b, A=A: A*b
-
-            self.__create_vec__ = lambda dim, A=A: A.create_vec(dim)
+            self.diagonal = block_diag_mat([bmat]*len(W))
+            self.index_sets = None
+            self.batched = self.batched_transpose = False
         # Otherwise there is some more work with extracting
         else:
             # All V
@@ -190,42 +299,146 @@ class VectorizedOperator(block_base):
             assert n == m == (W.dim()/nsubs)
 
             # Will need index sets for extracting components in Vj
-            index_set = [PETSc.IS().createGeneral(np.fromiter(W.sub(j).dofmap().dofs(), dtype='int32'))
-                         for j in range(nsubs)]
-            # Prealoc one working array
-            work = Function(W).vector().get_local()
+            self.index_sets = [index_set(W.sub(j).dofmap().dofs()) for j in range(nsubs)]
+            self.batched = batched and (is_petsc_mat(bmat) or hasattr(bmat, 'matmat'))
+            self.batched_transpose = self.batched and (is_petsc_mat(bmat) or hasattr(bmat, 'rmatmat'))
             
-            def __matvec__(self, b, A=bmat, indices=index_set, work=work):
-                for index in indices:
-                    # Exact apply assign
-                    bj = PETScVector(as_backend_type(b).vec().getSubVector(index))
-                    xj = A*bj
-                    work[index] = xj.get_local()
-
-                x = self.create_vec()
-                x.set_local(work)
-                return x
-            self.__matvec__ = __matvec__
-                
-            self.__create_vec__ = lambda dim, W=W: Function(W).vector()
-    
-    def matvec(self, b):
-        return self.__matvec__(self, b)
-
+    def apply(self, b, out=None):
+        '''out = A*b'''
+        if out is None: out = self.create_vec(0)
+        return self.apply_componentwise(b, out, False)
+
+    def apply_transpose(self, b, out=None):
+        '''out = A.T*b'''
+        if out is None: out = self.create_vec(1)
+        # Component by component the transpose would be block_transpose(bmat)
+        if not (is_number(self.bmat) or is_petsc_mat(self.bmat) or hasattr(self.bmat, 'transpmult')
+                or self.batched_transpose):
+            raise ValueError('%r has no transpose (transpmult or rmatmat)' % type(self.bmat))
+        return self.apply_componentwise(b, out, True)
+
+    def apply_componentwise(self, b, out, transpose):
+        '''bmat to every component'''
+        if self.index_sets is None:
+            for bi, xi in zip(b, out):
+                apply_operator(self.bmat, bi, xi, transpose)
+            return out
+
+        if self.batched_transpose if transpose else self.batched:
+            return self.apply_batched(b, out, transpose)
+
+        bj, xj, scatters = self.work('components', lambda: self.component_work(b))
+        b_, out_, bj_, xj_ = map(petsc_vec, (b, out, bj, xj))
+        for scatter in scatters:
+            scatter.scatter(b_, bj_, PETSc.InsertMode.INSERT_VALUES, PETSc.ScatterMode.FORWARD)
+            apply_operator(self.bmat, bj, xj, transpose)
+            scatter.scatter(xj_, out_, PETSc.InsertMode.INSERT_VALUES, PETSc.ScatterMode.REVERSE)
+        return out
+
+    def component_work(self, b):
+        '''Vectors for a component and scatters of components from b'''
+        n = self.W.dim()/len(self.index_sets)
+        bj, xj = Vector(mpi_comm_world(), n), Vector(mpi_comm_world(), n)
+
+        b_, bj_ = petsc_vec(b), petsc_vec(bj)
+        scatters = [PETSc.Scatter().create(b_, index, bj_, None) for index in self.index_sets]
+        return bj, xj, scatters
+
+    def apply_batched(self, b, out, transpose):
+        '''bmat to all the components at once'''
+        X, X_, gather = self.work('batch', self.batch_work)
+        gather.scatter(petsc_vec(b), X_, PETSc.InsertMode.INSERT_VALUES, PETSc.ScatterMode.FORWARD)
+
+        Y_ = self.multiply(X, X_, transpose)
+        gather.scatter(Y_, petsc_vec(out), PETSc.InsertMode.INSERT_VALUES, PETSc.ScatterMode.REVERSE)
+        return out
+
+    def batch_work(self):
+        '''Multivector of components, Vec of its values and gather from W to it'''
+        nsubs = len(self.index_sets)
+        n = self.W.dim()/nsubs
+        # Column major so the component j is the values [j*n, (j+1)*n)
+        array = np.zeros(n*nsubs, dtype=PETSc.ScalarType)
+        X = PETSc.Mat().createDense((n, nsubs), array=array)
+        X.assemble()
+        X_ = PETSc.Vec().createWithArray(array)
+        
+        indices = np.concatenate([iset.getIndices() for iset in self.index_sets])
+        w = petsc_vec(Function(self.W).vector())
+        gather = PETSc.Scatter().create(w, index_set(indices), X_, None)
+
+        return X, X_, gather
+
+    def multiply(self, X, X_, transpose):
+        '''Vec of values of A*X (A.T*X)'''
+        products = self.work('products', dict)
+        # Sparse-dense product; reuse of the result after first time
+        if is_petsc_mat(self.bmat):
+            A = as_petsc(self.bmat)
+            mult = A.transposeMatMult if transpose else A.matMult
+            if transpose in products:
+                Y, Y_ = products[transpose]
+                mult(X, Y)
+            else:
+                Y = mult(X)
+                Y_ = PETSc.Vec().createWithArray(Y.getDenseArray().ravel(order='F'))
+                products[transpose] = (Y, Y_)
+            return Y_
+        
+        if transpose not in products:
+            products[transpose] = (None, X_.duplicate())
+        _, Y_ = products[transpose]
+        
+        Y = (self.bmat.rmatmat if transpose else self.bmat.matmat)(X.getDenseArray())
+        Y_.setArray(np.asarray(Y).ravel(order='F'))
+        return Y_
+        
     @vec_pool
-    def create_vec(self, dim):
-        return self.__create_vec__(dim)
+    def create_vec(self, dim=1):
+        if self.index_sets is None:
+            return self.diagonal.create_vec(dim)
+        return Function(self.W).vector()
 
     
 def is_increasing(seq):
-    if not seq:
-        return False
-    if len(seq) == 1:
-        return True
-    return seq[0] < seq[1] and is_increasing(seq[1:])
-
-
-class ReductionOperator(block_base):
+    '''Strictly increasing nonempty sequence'''
+    return len(seq) > 0 and all(a < b for a, b in zip(seq[:-1], seq[1:]))
+
+
+def index_set(indices):
+    '''PETSc IS of indices; stride if they are an arithmetic progression'''
+    indices = np.asarray(indices, dtype=PETSc.IntType)
+    if len(indices) > 1:
+        step = indices[1] - indices[0]
+        if np.all(np.diff(indices) == step):
+            return PETSc.IS().createStride(len(indices), first=int(indices[0]), step=int(step))
+    return PETSc.IS().createGeneral(indices)
+
+
+# Scatters between the vector of a group of spaces (their concatenation)
+# and vectors of the spaces depend only on the sizes. They are shared by
+# all the ReductionOperators. NOTE: serial only, like the operators.
+_group_scatters = {}
+_lock = threading.Lock()
+
+
+def group_scatters(sizes):
+    '''Scatters from vector with blocks of sizes to each of the blocks'''
+    sizes = tuple(sizes)
+    with _lock:
+        if sizes not in _group_scatters:
+            group = petsc_vec(Vector(mpi_comm_world(), sum(sizes)))
+            scatters, first = [], 0
+            for size in sizes:
+                block = petsc_vec(Vector(mpi_comm_world(), size))
+                iset = PETSc.IS().createStride(size, first=first, step=1)
+                scatters.append(PETSc.Scatter().create(group, iset, block, None))
+                first += size
+            _group_scatters[sizes] = scatters
+        return _group_scatters[sizes]
+
+
+class ReductionOperator(WorkOperator):
     '''
     This operator reduces block vector into a block vector with 
     at most the same number of blocks. The size of the blocks is specified
@@ -237,98 +450,108 @@ class ReductionOperator(block_base):
         assert len(W) == offsets[-1]
         assert is_increasing(offsets)
         self.offsets = [0] + offsets
+        self.W = W
 
-        self.index_sets = []
-        for f, l in zip(self.offsets[:-1], self.offsets[1:]):
-            if (l - f) == 1:
-                self.index_sets.append([])
-            else:
-                index_set = []
-                prev = 0
-                for Wi in W[f:l]:
-                    this = Wi.dofmap().dofs() + prev
-                    index_set.append(PETSc.IS().createGeneral(this.tolist()))
-                    prev = len(this)
-                self.index_sets.append(index_set)
+        # Sizes of the blocks of the reduced vectors
+        self.groups = [tuple(Wi.dim() for Wi in W[f:l])
+                       for f, l in zip(self.offsets[:-1], self.offsets[1:])]
         # Handle get_dims
         self.__sizes__ = (sum(Wi.dim() for Wi in W), )*2
 
-    def matvec(self, b):
+    def apply(self, b, out=None):
         '''Reduce'''
-        # print type(b), b.size(), self.offsets
-        # assert b.size() == self.offsets[-1]
-
-        reduced = []
-        for f, l in zip(self.offsets[:-1], self.offsets[1:]):
+        if out is None: out = self.create_vec(0)
+        
+        reduced = out.blocks if isinstance(out, block_vec) else [out]
+        for i, (f, l) in enumerate(zip(self.offsets[:-1], self.offsets[1:])):
             if (l - f) == 1:
-                reduced.append(b[f])
+                assign(reduced[i], b[f])
             else:
-                reduced.append(PETScVector(as_petsc_nest(block_vec(b.blocks[f:l]))))
-        return block_vec(reduced) if len(reduced) > 1 else reduced[0]
+                group = b.blocks[f:l]
+                for scatter, bk in zip(group_scatters(self.groups[i]), group):
+                    scatter.scatter(petsc_vec(bk), petsc_vec(reduced[i]),
+                                    PETSc.InsertMode.INSERT_VALUES, PETSc.ScatterMode.REVERSE)
+        return out
 
-    def transpmult(self, b):
+    def apply_transpose(self, b, out=None):
         '''Unpack'''
-        if isinstance(b, (Vector, GenericVector)):
-            b = [b]
-        else:
-            b = b.blocks
-        n = len(b)
-        assert n == len(self.index_sets), self.index_sets
-
-        unpacked = []
-        for bi, iset in zip(b, self.index_sets):
-            if len(iset) == 0:
-                unpacked.append(bi)
+        b = b.blocks if isinstance(b, block_vec) else [b]
+        assert len(b) == len(self.groups), self.groups
+
+        if out is None: out = self.create_vec(1)
+
+        unpacked = out.blocks
+        for i, (f, l) in enumerate(zip(self.offsets[:-1], self.offsets[1:])):
+            if (l - f) == 1:
+                assign(unpacked[f], b[i])
             else:
-                x_petsc = as_backend_type(bi).vec()
+                group = unpacked[f:l]
+                for scatter, xk in zip(group_scatters(self.groups[i]), group):
+                    scatter.scatter(petsc_vec(b[i]), petsc_vec(xk),
+                                    PETSc.InsertMode.INSERT_VALUES, PETSc.ScatterMode.FORWARD)
+        return out
 
-                subvecs = map(lambda indices, x=x_petsc: PETScVector(x.getSubVector(indices)),
-                              iset)
+    @vec_pool
+    def create_vec(self, dim=1):
+        if dim == 1:
+            return block_vec([Function(Wi).vector() for Wi in self.W])
 
-                unpacked.extend(subvecs)
-        return block_vec(unpacked)
+        reduced = []
+        for f, l in zip(self.offsets[:-1], self.offsets[1:]):
+            if (l - f) == 1:
+                reduced.append(Function(self.W[f]).vector())
+            else:
+                reduced.append(Vector(mpi_comm_world(), sum(Wi.dim() for Wi in self.W[f:l])))
+        return block_vec(reduced) if len(reduced) > 1 else reduced[0]
 
     
-class RegroupOperator(block_base):
+class RegroupOperator(WorkOperator):
     '''Block vec to Block vec of block_vec/vecs.'''
     def __init__(self, offsets, W):
         assert len(W) == offsets[-1]
         assert is_increasing(offsets)
         self.offsets = [0] + offsets
 
-    def matvec(self, b):
-        '''Reduce'''
-
+    def apply(self, b, out=None):
+        '''Reduce; without out the result shares vectors with b'''
         reduced = []
         for f, l in zip(self.offsets[:-1], self.offsets[1:]):
             if (l - f) == 1:
                 reduced.append(b[f])
             else:
                 reduced.append(block_vec(b.blocks[f:l]))
-        return block_vec(reduced) if len(reduced) > 1 else reduced[0]
+        reduced = block_vec(reduced) if len(reduced) > 1 else reduced[0]
+        
+        return reduced if out is None else assign(out, reduced)
 
-    def transpmult(self, b):
-        '''Unpack'''
+    def apply_transpose(self, b, out=None):
+        '''Unpack; without out the result shares vectors with b'''
         b_block = []
         for bi in b:
             if isinstance(bi, (Vector, GenericVector)):
                 b_block.append(bi)
             else:
                 b_block.extend(bi.blocks)
-                
-        return block_vec(b_block)
+        b_block = block_vec(b_block)
+        
+        return b_block if out is None else assign(out, b_block)
 
     
-class BlockPC(block_base):
+class BlockPC(WorkOperator):
     '''Wrap petsc preconditioner for cbc.block'''
     def __init__(self, pc):
         self.pc = pc
         self.A = pc.getOperators()[0]
 
-    def matvec(self, x):
-        y = self.create_vec(0)
-        self.pc.apply(as_petsc(x), as_petsc(y))
-        return y
+    def apply(self, x, out=None):
+        if out is None: out = self.create_vec(0)
+        self.pc.apply(as_petsc(x), as_petsc(out))
+        return out
+
+    def apply_transpose(self, x, out=None):
+        if out is None: out = self.create_vec(1)
+        self.pc.applyTranspose(as_petsc(x), as_petsc(out))
+        return out
         
     @vec_pool
     def create_vec(self, dim):
@@ -1,6 +1,8 @@
 from xii.linalg.matrix_utils import (is_petsc_vec, is_petsc_mat, diagonal_matrix,
                                      is_number, as_petsc, petsc_serial_matrix,
-                                     zero_matrix)
+                                     zero_matrix, transpose_matrix)
+from xii.linalg.function import contiguous_owner
+from xii.profiling import profiled
 import xii
 
 from block.block_compose import block_mul, block_add, block_sub, block_transpose
@@ -17,13 +19,34 @@ import operator
 COMM = PETSc.COMM_WORLD
 
 
-def convert(bmat, algorithm='numpy'):
+def convert(bmat, algorithm='csr', fields=False):
     '''
     Attempt to convert bmat to a PETSc(Matrix/Vector) object.
-    If succed this is at worst a number.
+    If succed this is at worst a number. The monolithic matrix is filled
+    directly from CSR of the blocks ('csr') or built by scipy ('numpy').
+    With fields (True or groups of blocks, see fieldsplit.block_index_sets)
+    the index sets of the blocks are returned too.
     '''
+    converted = convert_(bmat, algorithm)
+    if not fields:
+        return converted
+
+    from xii.linalg.fieldsplit import block_index_sets
+
+    groups = None if fields is True else fields
+    return converted, block_index_sets(bmat, groups)
+
+
+@profiled('convert')
+def convert_(bmat, algorithm='csr'):
+    '''Do the work of convert'''
     # Block vec conversion
     if isinstance(bmat, block_vec):
+        # Blocks are already pieces of one vector
+        owner = contiguous_owner(bmat)
+        if owner is not None:
+            return PETScVector(owner)
+        
         array = block_vec_to_numpy(bmat)
         vec = PETSc.Vec().createWithArray(array)
         vec.assemble()
@@ -38,10 +61,10 @@ def convert(bmat, algorithm='numpy'):
         indices = itertools.product(range(nrows), range(ncols))
         
         blocks = np.zeros((nrows, ncols), dtype='object')
-        for block, (i, j) in zip(bmat.blocks.flatten(), indices):
+        # Blocks share subexpressions
+        collapsed = collapse_blocks(bmat.blocks.flatten())
+        for A, (i, j) in zip(collapsed, indices):
             # This might is guaranteed to be matrix or number
-            A = collapse(block)
-
             if is_number(A):
                 # Diagonal matrices can be anything provided square
                 if i == j and row_sizes[i] == col_sizes[j]:
@@ -64,6 +87,9 @@ def convert(bmat, algorithm='numpy'):
             set_lg_map(bmat)
             return bmat
         
+        if algorithm == 'csr':
+            return block_mat_to_aij(bmat)
+        
         # Monolithic via numpy (fast)
         # Convert to numpy
         array = block_mat_to_numpy(bmat)
@@ -74,8 +100,45 @@ def convert(bmat, algorithm='numpy'):
     return collapse(bmat)
 
 
-def collapse(bmat):
-    '''Collapse what are blocks of bmat'''
+# Collapsing works on expression trees of cbc.block. Identical subtrees 
+# (e.g. the reduction operator T or T^T shared by many blocks) are collapsed
+# only once; the collapsed subexpressions are remembered in memo keyed by
+# the structure of the expression. Scalars in products are folded into one
+# scale and the order of multiplying the matrices in the product is picked
+# to minimize the estimated work.
+def expr_key(bmat):
+    '''Structure of the expression as hashable'''
+    if is_number(bmat):
+        return ('number', bmat)
+    if is_petsc_mat(bmat):
+        return ('mat', as_petsc(bmat).handle)
+    if isinstance(bmat, block_mul):
+        return ('*', ) + tuple(map(expr_key, bmat.chain))
+    if isinstance(bmat, block_add):
+        return ('+', expr_key(bmat.A), expr_key(bmat.B))
+    if isinstance(bmat, block_sub):
+        return ('-', expr_key(bmat.A), expr_key(bmat.B))
+    if isinstance(bmat, block_transpose):
+        return ('T', expr_key(bmat.A))
+    return ('id', id(bmat))
+
+
+@profiled('collapse')
+def collapse(bmat, memo=None):
+    '''
+    Collapse what are blocks of bmat. Memo (dict) can be shared between 
+    calls to reuse the collapsed subexpressions. The result is the caller's
+    to modify; remembered matrices (transposes, matrix representations of
+    operators) are used as they are only inside the expressions.
+    '''
+    C = collapse_(bmat, memo)
+    if C is not bmat and is_petsc_mat(C) and (isinstance(bmat, block_transpose) or hasattr(bmat, 'matrix')):
+        C = PETScMatrix(as_petsc(C).copy())
+    return C
+
+
+def collapse_(bmat, memo=None):
+    '''Collapse of bmat where the result might be a remembered matrix'''
     # Single block cases
     # Do nothing
     if is_petsc_mat(bmat) or is_number(bmat) or is_petsc_vec(bmat):
@@ -84,18 +147,24 @@ def collapse(bmat):
     if isinstance(bmat, (Vector, Matrix, GenericVector)):
         return bmat
 
+    if memo is None: memo = {}
+
+    key = expr_key(bmat)
+    if key in memo:
+        return memo[key]
+
     # Multiplication
     if isinstance(bmat, block_mul):
-        return collapse_mul(bmat)
+        C = collapse_mul(bmat, memo)
     # +
     elif isinstance(bmat, block_add):
-        return collapse_add(bmat)
+        C = collapse_add(bmat, memo)
     # -
     elif isinstance(bmat, block_sub):
-        return collapse_sub(bmat)
+        C = collapse_sub(bmat, memo)
     # T
     elif isinstance(bmat, block_transpose):
-        return collapse_tr(bmat)
+        C = collapse_tr(bmat, memo)
     # Some things in cbc.block know their matrix representation
     # This is typically diagonals like InvLumpDiag etc
     elif hasattr(bmat, 'v'):
@@ -108,93 +177,171 @@ def collapse(bmat):
         mat.setDiagonal(diagonal)
         mat.assemblyEnd()
 
-        return PETScMatrix(mat)
+        C = PETScMatrix(mat)
     # Some operators actually have matrix repre (HsMG)
     elif hasattr(bmat, 'matrix'):
-        return bmat.matrix
-
-    raise ValueError('Do not know how to collapse %r' % type(bmat))
+        C = bmat.matrix
+    else:
+        raise ValueError('Do not know how to collapse %r' % type(bmat))
+    # NOTE: the expression is kept so that the ids/handles in key stay valid
+    memo[key] = C
+    memo.setdefault('expressions', []).append(bmat)
+    
+    return C
 
 
-def collapse_tr(bmat):
+def collapse_blocks(blocks):
+    '''
+    Collapse an iterable of blocks sharing the collapsed subexpressions.
+    Every block gets its own matrix.
+    '''
+    memo, seen, collapsed = {}, set(), []
+    for block in blocks:
+        C = collapse(block, memo)
+        # Identical blocks should not be the same matrix
+        if is_petsc_mat(C) and C is not block:
+            handle = as_petsc(C).handle
+            if handle in seen:
+                C = PETScMatrix(as_petsc(C).copy())
+                handle = as_petsc(C).handle
+            seen.add(handle)
+        collapsed.append(C)
+    return collapsed
+
+
+def collapse_tr(bmat, memo=None):
     '''to Transpose'''
     # Base
     A = bmat.A
     if is_petsc_mat(A):
-        A_ = as_petsc(A)
-        C_ = PETSc.Mat()
-        A_.transpose(C_)
-        return PETScMatrix(C_)
+        # Remembered by A
+        return PETScMatrix(transpose_matrix(as_petsc(A)))
     # Recurse
-    return collapse_tr(collapse(bmat))
+    return collapse_tr(block_transpose(collapse_(A, memo)))
+
+
+def sum_terms(bmat, sign=1):
+    '''Flatten A + B - C ... into [(1, A), (1, B), (-1, C), ...]'''
+    if isinstance(bmat, block_add):
+        return sum_terms(bmat.A, sign) + sum_terms(bmat.B, sign)
+    if isinstance(bmat, block_sub):
+        return sum_terms(bmat.A, sign) + sum_terms(bmat.B, -sign)
+    return [(sign, bmat)]
 
 
-def collapse_add(bmat):
+def collapse_sum(bmat, memo=None):
+    '''Sum (with signs) of terms to single matrix'''
+    terms = [(sign, collapse_(term, memo)) for sign, term in sum_terms(bmat)]
+
+    assert all(is_petsc_mat(term) for _, term in terms), 'Only matrices can be summed'
+
+    sign, first = terms[0]
+    C_ = as_petsc(first).copy()
+    if sign < 0: C_.scale(-1.)
+
+    for sign, term in terms[1:]:
+        B_ = as_petsc(term)
+        assert C_.size == B_.size
+        # C = C +- B
+        C_.axpy(float(sign), B_, PETSc.Mat.Structure.DIFFERENT)
+    return PETScMatrix(C_)
+
+
+def collapse_add(bmat, memo=None):
     '''A + B to single matrix'''
-    A, B = bmat.A, bmat.B
-    # Base case
-    if is_petsc_mat(A) and is_petsc_mat(B):
-        A_ = as_petsc(A)
-        B_ = as_petsc(B)
-        assert A_.size == B_.size
-        C_ = A_.copy()
-        # C = A + B
-        C_.axpy(1., B_, PETSc.Mat.Structure.DIFFERENT)
-        return PETScMatrix(C_)
-    # Recurse
-    return collapse_add(collapse(A) + collapse(B))
+    return collapse_sum(bmat, memo)
 
 
-def collapse_sub(bmat):
+def collapse_sub(bmat, memo=None):
     '''A - B to single matrix'''
-    A, B = bmat.A, bmat.B
-    # Base case
-    if is_petsc_mat(A) and is_petsc_mat(B):
-        A_ = as_petsc(A)
-        B_ = as_petsc(B)
-        assert A_.size == B_.size
-        C_ = A_.copy()
-        # C = A - B
-        C_.axpy(-1., B_, PETSc.Mat.Structure.DIFFERENT)
-        return PETScMatrix(C_)
-    # Recurse
-    return collapse_sub(collapse(A) - collapse(B))
+    return collapse_sum(bmat, memo)
+
+
+def mul_factors(bmat):
+    '''Flatten (A*B)*(C*D) into [A, B, C, D]'''
+    if isinstance(bmat, block_mul):
+        return sum(map(mul_factors, bmat.chain), [])
+    return [bmat]
+
 
+def mul_cost(left, right):
+    '''
+    Estimated (flops, nnz) for product of matrices described by
+    (nrows, ncols, nnz); each nonzero of left meets a row of right
+    '''
+    m, k, nnz_left = left
+    _, n, nnz_right = right
 
-def collapse_mul(bmat):
+    flops = nnz_left*float(nnz_right)/max(k, 1)
+    return flops, min(m*float(n), flops)
+
+
+def chain_order(shapes):
+    '''
+    Matrix chain ordering (dynamic programming). Shapes are (nrows, ncols, nnz)
+    of the factors. Return split table, split[i][j] is where the product 
+    i..j is split into (i..k)*(k+1..j).
+    '''
+    n = len(shapes)
+    cost = [[0.]*n for _ in range(n)]
+    shape = [[shapes[i] if i == j else None for j in range(n)] for i in range(n)]
+    split = [[None]*n for _ in range(n)]
+
+    for length in range(2, n+1):
+        for i in range(n-length+1):
+            j = i + length - 1
+            for k in range(i, j):
+                flops, nnz = mul_cost(shape[i][k], shape[k+1][j])
+                c = cost[i][k] + cost[k+1][j] + flops
+                if split[i][j] is None or c < cost[i][j]:
+                    cost[i][j] = c
+                    split[i][j] = k
+                    shape[i][j] = (shape[i][k][0], shape[k+1][j][1], nnz)
+    return split
+
+
+def collapse_mul(bmat, memo=None):
     '''A*B*C to single matrix'''
-    # A0 * A1 * ...
-    A, B = bmat.chain[0], bmat.chain[1:]
-
-    if len(B) == 1:
-        B = B[0]
-        # Two matrices
-        if is_petsc_mat(A) and is_petsc_mat(B):
-            A_ = as_petsc(A)
-            B_ = as_petsc(B)
+    if memo is None: memo = {}
+    
+    factors = [collapse_(factor, memo) for factor in mul_factors(bmat)]
+    # Fold the scalars
+    scale = reduce(operator.mul, [f for f in factors if is_number(f)], 1)
+    matrices = [f for f in factors if not is_number(f)]
+
+    if not matrices:
+        return scale
+    assert all(is_petsc_mat(f) for f in matrices)
+
+    keys = map(expr_key, matrices)
+    shapes = []
+    for A in matrices:
+        A_ = as_petsc(A)
+        shapes.append(A_.size + (A_.getInfo()['nz_used'], ))
+    split = chain_order(shapes)
+
+    def product(i, j):
+        '''Matrix for the product of matrices i..j'''
+        if i == j:
+            return matrices[i]
+        
+        key = ('*', ) + tuple(keys[i:j+1])
+        if key not in memo:
+            k = split[i][j]
+            A_, B_ = as_petsc(product(i, k)), as_petsc(product(k+1, j))
             assert A_.size[1] == B_.size[0]
             C_ = PETSc.Mat()
             A_.matMult(B_, C_)
+            memo[key] = PETScMatrix(C_)
+        return memo[key]
 
-            return PETScMatrix(C_)
-        # One of them is a number
-        elif is_petsc_mat(A) and is_number(B):
-            A_ = as_petsc(A)
-            C_ = A_.copy()
-            C_.scale(B)
-            return PETScMatrix(C_)
-
-        elif is_petsc_mat(B) and is_number(A):
-            B_ = as_petsc(B)
-            C_ = B_.copy()
-            C_.scale(A)
-            return PETScMatrix(C_)
-        # Some compositions
-        else:
-            return collapse(collapse(A)*collapse(B))
-    # Recurse
-    else:
-        return collapse_mul(collapse(A)*collapse(reduce(operator.mul, B)))                                    
+    C = product(0, len(matrices)-1)
+    if scale == 1 and len(matrices) > 1:
+        return C
+    # Don't touch the memoized/original ones
+    C_ = as_petsc(C).copy()
+    C_.scale(scale)
+    return PETScMatrix(C_)
 
     
 # Conversion via numpy
@@ -219,6 +366,50 @@ def block_mat_to_numpy(bmat):
     return numpy_block_mat(blocks).tocsr()
 
 
+def block_mat_to_aij(bmat):
+    '''
+    Monolithic matrix from block_mat of matrices. The CSR arrays of the
+    result are allocated once and filled by block rows; PETSc then uses 
+    them as they are. So the peak memory is the result + one block row.
+    '''
+    blocks = bmat.blocks
+    row_sizes = [as_petsc(row[0]).size[0] for row in blocks]
+    col_sizes = [as_petsc(A).size[1] for A in blocks[0]]
+    col_offsets = np.cumsum([0] + col_sizes)
+
+    nnz = sum(int(as_petsc(A).getInfo()['nz_used']) for A in blocks.flatten())
+
+    indptr = np.zeros(sum(row_sizes)+1, dtype=PETSc.IntType)
+    indices = np.empty(nnz, dtype=PETSc.IntType)
+    data = np.empty(nnz, dtype=PETSc.ScalarType)
+
+    row_offset = 0
+    for row, nrows in zip(blocks, row_sizes):
+        csrs = [as_petsc(A).getValuesCSR() for A in row]
+        row_nnz = [np.diff(csr[0]) for csr in csrs]
+        # Where the rows of this block row start in the result
+        first = indptr[row_offset]
+        indptr[row_offset+1:row_offset+nrows+1] = first + np.cumsum(sum(row_nnz))
+        
+        start = indptr[row_offset:row_offset+nrows].astype('int64')
+        for (block_indptr, block_indices, block_data), counts, col_offset in zip(csrs, row_nnz, col_offsets):
+            # Entry k of block row r goes to start[r] + k - block_indptr[r]
+            positions = (np.arange(len(block_indices), dtype='int64') +
+                         np.repeat(start - block_indptr[:-1], counts))
+            indices[positions] = block_indices + col_offset
+            data[positions] = block_data
+            # Next block's values in the row come after these
+            start += counts
+        row_offset += nrows
+    assert indptr[-1] == nnz
+
+    mat = PETSc.Mat().createAIJWithArrays(size=(sum(row_sizes), col_offsets[-1]),
+                                          csr=(indptr, indices, data),
+                                          comm=COMM)
+    mat.assemble()
+    return PETScMatrix(mat)
+
+
 def numpy_to_petsc(mat):
     '''Build PETScMatrix with array structure'''
     # Dense array to matrix
@@ -364,6 +555,19 @@ def bmat_sizes(bmat):
     raise ValueError('Cannot bmat_sizes of %r, %s' % (type(bmat), bmat))
 
 
+# The identity maps are shared by the matrices of the same size
+_identity_lgmaps = {}
+
+
+def identity_lgmap(size):
+    '''Local-to-global map of range(size)'''
+    if size not in _identity_lgmaps:
+        comm = mpi_comm_world().tompi4py()
+        indices = np.arange(size, dtype=PETSc.IntType)
+        _identity_lgmaps[size] = PETSc.LGMap().create(indices, comm=comm)
+    return _identity_lgmaps[size]
+
+
 def set_lg_map(mat):
     '''Set local-to-global-map on the matrix'''
     # NOTE; serial only - so we own everything but still sometimes we need
@@ -377,12 +581,8 @@ def set_lg_map(mat):
         blocks = np.array(map(set_lg_map, mat.blocks.flatten())).reshape(mat.blocks.shape)
         return block_mat(blocks)
 
-    comm = mpi_comm_world().tompi4py()
     # Work with matrix
-    rowmap, colmap = range(mat.size(0)), range(mat.size(1))
-
-    row_lgmap = PETSc.LGMap().create(rowmap, comm=comm)
-    col_lgmap = PETSc.LGMap().create(colmap, comm=comm)
+    row_lgmap, col_lgmap = identity_lgmap(mat.size(0)), identity_lgmap(mat.size(1))
 
     as_petsc(mat).setLGMap(row_lgmap, col_lgmap)
 
@@ -416,7 +616,7 @@ if __name__ == '__main__':
     print t.stop()
 
     t = Timer('x'); t.start()
-    Y = convert(AA, 'foo')
+    Y = convert(AA, 'numpy')
     print t.stop()
 
     X_ = X.array()
@@ -0,0 +1,56 @@
+from xii.linalg.convert import bmat_sizes
+
+from block import block_mat, block_vec
+from petsc4py import PETSc
+import numpy as np
+
+
+# With the block system converted to a monolithic matrix PETSc's own block 
+# preconditioners (PCFIELDSPLIT) need to know where the blocks are. The 
+# fields are described by index sets of (rows of) the monolithic matrix;
+# the block i is the field named str(i) so that the options are
+# -fieldsplit_0_pc_type ... Groups of blocks are fields too, e.g. 
+# {'u': (0, 1), 'p': (2, )} gives -fieldsplit_u_... and -fieldsplit_p_...
+def block_sizes(bmat):
+    '''Sizes of (row) blocks of block_mat/block_vec'''
+    if isinstance(bmat, block_vec):
+        return [v.size() for v in bmat]
+
+    assert isinstance(bmat, block_mat)
+    row_sizes, _ = bmat_sizes(bmat)
+    assert all(size is not None for size in row_sizes), 'Rows of only numbers'
+    return list(row_sizes)
+
+
+def block_index_sets(bmat, groups=None):
+    '''
+    Fields as [(name, IS)] of blocks of bmat in the monolithic numbering.
+    Groups are {name: block indices} and then only the groups are fields.
+    '''
+    offsets = np.cumsum([0] + block_sizes(bmat))
+    comm = PETSc.COMM_WORLD
+
+    blocks = [PETSc.IS().createStride(last-first, first, 1, comm=comm)
+              for first, last in zip(offsets[:-1], offsets[1:])]
+
+    if groups is None:
+        return [(str(i), iset) for i, iset in enumerate(blocks)]
+
+    fields = []
+    for name, indices in sorted(groups.items(), key=lambda item: min(item[1])):
+        dofs = np.hstack([np.arange(offsets[i], offsets[i+1], dtype=PETSc.IntType)
+                          for i in indices])
+        fields.append((name, PETSc.IS().createGeneral(dofs, comm=comm)))
+    return fields
+
+
+def setup_fieldsplit(ksp, fields):
+    '''
+    Make PC of ksp a fieldsplit over fields ([(name, IS)]). The rest is up
+    to the options (-pc_fieldsplit_type schur ...) so call ksp.setFromOptions
+    afterwards.
+    '''
+    pc = ksp.getPC()
+    pc.setType(PETSc.PC.Type.FIELDSPLIT)
+    pc.setFieldSplitIS(*fields)
+    return pc
@@ -0,0 +1,191 @@
+from xii.linalg.block_utils import WorkOperator, VectorizedOperator, petsc_vec
+from xii.linalg.matrix_utils import as_petsc
+
+from dolfin import PETScVector
+from scipy.sparse import csr_matrix
+from petsc4py import PETSc
+import numpy as np
+
+
+# Fractional operators sum_j alpha_j H^{s_j}, H^s = M*U*diag(lmbda^s)*U^T*M
+# where A U = lmbda M U, U^T M U = I (see hsmg), are dense. But if f(lmbda) =
+# sum_j alpha_j lmbda^{s_j} (or 1/f) is approximated on the spectrum by a
+# rational function r(lmbda) = c0 + sum_k c_k/(lmbda + p_k) then, using
+# U*diag(1/(lmbda + p))*U^T = (A + p M)^{-1}, the operator is a combination
+# of sparse shifted solves
+#
+#   inverse: c0 M^{-1} + sum_k c_k (A + p_k M)^{-1}
+#   forward: c0 M + sum_k c_k M (A + p_k M)^{-1} M
+#
+# The approximation is computed by AAA algorithm [Nakatsukasa, Sete,
+# Trefethen; SIAM J. Sci. Comput. 2018].
+def aaa(Z, F, tol=1E-13, mmax=100):
+    '''
+    AAA rational approximation of F(Z) in barycentric form as support
+    points, values and weights.
+    '''
+    import scipy.linalg as la
+
+    Z, F = np.asarray(Z, dtype=float), np.asarray(F, dtype=float)
+    # Points which are not support
+    J = np.ones(len(Z), dtype=bool)
+    support, values, columns = [], [], []
+
+    R = np.mean(F)*np.ones_like(F)
+    for m in range(mmax):
+        j = np.argmax(np.abs(F - R))
+        support.append(Z[j])
+        values.append(F[j])
+        J[j] = False
+        # Cauchy matrix
+        with np.errstate(divide='ignore'):
+            columns.append(1./(Z - Z[j]))
+        C = np.column_stack(columns)[J]
+        f = np.array(values)
+        # Weights minimize the linearized residual
+        loewner = F[J, None]*C - C*f
+        w = la.svd(loewner)[2][-1]
+
+        R = F.copy()
+        R[J] = C.dot(w*f)/C.dot(w)
+        if np.max(np.abs(F - R)) <= tol*np.max(np.abs(F)):
+            break
+    return np.array(support), f, w
+
+
+def partial_fractions(z, f, w):
+    '''Barycentric to r(x) = c0 + sum_k residues_k/(x - poles_k)'''
+    import scipy.linalg as la
+
+    m = len(z)
+    # Poles are the finite generalized eigenvalues
+    B = np.eye(m+1)
+    B[0, 0] = 0
+    E = np.zeros((m+1, m+1))
+    E[0, 1:], E[1:, 0], E[1:, 1:] = w, 1, np.diag(z)
+
+    poles = la.eig(E, B, right=False)
+    poles = poles[np.isfinite(poles)]
+    # N(pole)/D'(pole)
+    d = poles[:, None] - z[None, :]
+    residues = (1./d).dot(w*f)/(-(1./d**2).dot(w))
+    # At infinity
+    c0 = np.sum(w*f)/np.sum(w)
+
+    return c0, poles, residues
+
+
+def as_scipy(A):
+    '''Scipy CSR of the matrix'''
+    A = as_petsc(A)
+    indptr, indices, data = A.getValuesCSR()
+    return csr_matrix((data, indices, indptr), shape=A.getSize())
+
+
+def spectrum_bounds(A, M, safety=2.):
+    '''Interval containing the generalized eigenvalues of A, M (SPD)'''
+    from scipy.sparse.linalg import eigsh
+
+    A, M = as_scipy(A), as_scipy(M)
+    lmax, = eigsh(A, 1, M, which='LA', tol=1E-3, return_eigenvectors=False)
+    lmin, = eigsh(A, 1, M, sigma=0, which='LM', tol=1E-3, return_eigenvectors=False)
+
+    if lmin <= 0:
+        raise ValueError('A is not positive definite, lmin = %g' % lmin)
+    return lmin/safety, lmax*safety
+
+
+class FractionalOperator(WorkOperator):
+    '''
+    Rational approximation of sum_j alpha_j H^{s_j} (terms are (alpha_j, s_j))
+    or its inverse. Bounds of the spectrum of (A, M) are estimated unless
+    given. The shifted systems are solved by KSP of ksp_type with pc_type
+    (default AMG) which are set up once.
+    '''
+    def __init__(self, A, M, terms, inverse=False, bounds=None, tol=1E-10, npoints=500,
+                 ksp_type='cg', pc_type='hypre', rtol=1E-12):
+        self.A_, self.M_ = as_petsc(A), as_petsc(M)
+        self.inverse = inverse
+
+        lmin, lmax = bounds if bounds is not None else spectrum_bounds(A, M)
+        f = lambda x: sum(alpha*x**s for alpha, s in terms)
+        g = (lambda x: 1./f(x)) if inverse else f
+
+        Z = np.logspace(np.log10(lmin), np.log10(lmax), npoints)
+        c0, poles, residues = partial_fractions(*aaa(Z, g(Z), tol))
+        # Spurious poles (Froissart doublets) have no weight
+        keep = np.abs(residues) > 1E-14*np.max(np.abs(residues))
+        poles, residues = poles[keep], residues[keep]
+        # Shifted matrices must be SPD
+        if np.any(np.abs(poles.imag) > 1E-8*np.abs(poles)) or np.any(poles.real >= lmin):
+            raise ValueError('Rational approximation has poles in the spectrum')
+
+        self.c0 = c0.real
+        self.shifts, self.weights = -poles.real, residues.real
+
+        def solver(S, pc_type):
+            ksp = PETSc.KSP().create()
+            ksp.setOperators(S)
+            ksp.setType(ksp_type)
+            ksp.getPC().setType(pc_type)
+            ksp.setTolerances(rtol=rtol)
+            ksp.setUp()
+            return ksp
+
+        self.solvers = []
+        for shift in self.shifts:
+            S = self.A_.copy()
+            S.axpy(shift, self.M_)
+            self.solvers.append(solver(S, pc_type))
+        # For c0 M^{-1}
+        self.mass_solver = solver(self.M_, 'jacobi') if inverse else None
+        # Handle get_dims
+        self.__sizes__ = self.A_.getSize()
+
+    def apply(self, b, out=None):
+        '''out = r(H)*b'''
+        if out is None: out = self.create_vec(0)
+
+        b_, x_ = petsc_vec(b), petsc_vec(out)
+        y, z = self.work('vecs', lambda: (self.M_.createVecLeft(), self.M_.createVecLeft()))
+
+        x_.zeroEntries()
+        if self.inverse:
+            self.mass_solver.solve(b_, y)
+            x_.axpy(self.c0, y)
+            for weight, ksp in zip(self.weights, self.solvers):
+                ksp.solve(b_, y)
+                x_.axpy(weight, y)
+        else:
+            # c0*Mb + M*(sum_k c_k S_k^{-1} Mb)
+            Mb = self.work('Mb', self.M_.createVecLeft)
+            self.M_.mult(b_, Mb)
+            z.zeroEntries()
+            for weight, ksp in zip(self.weights, self.solvers):
+                ksp.solve(Mb, y)
+                z.axpy(weight, y)
+            self.M_.mult(z, x_)
+            x_.axpy(self.c0, Mb)
+        return out
+
+    # Symmetric
+    apply_transpose = apply
+
+    def create_vec(self, dim=1):
+        return PETScVector(self.A_.createVecLeft() if dim == 0 else self.A_.createVecRight())
+
+
+def rational_inverse(bmat, **kwargs):
+    '''
+    Inverse of sum_j alpha_j H^{s_j} (the expressions of hsmg_utils.inverse)
+    by rational approximation, see FractionalOperator for kwargs.
+    '''
+    from xii.linalg import hsmg_utils
+
+    if isinstance(bmat, VectorizedOperator):
+        return VectorizedOperator(rational_inverse(bmat.bmat, **kwargs), bmat.W)
+
+    assert hsmg_utils.is_well_defined(bmat)
+    A, M = hsmg_utils.extract_attributes(bmat, ('A', 'M'))
+
+    return FractionalOperator(A, M, hsmg_utils.collect(bmat), inverse=True, **kwargs)
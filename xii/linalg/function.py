@@ -2,6 +2,7 @@ from dolfin import Function, as_backend_type, PETScVector
 import dolfin as df
 from block import block_vec
 from petsc4py import PETSc
+import numpy as np
 
 
 first = lambda iterable: next(iter(iterable))
@@ -14,10 +15,86 @@ def as_petsc_nest(bvec):
     return PETSc.Vec().createNest(nest)
 
 
+# In the contiguous layout one PETSc Vec owns the values of all the
+# components and the vectors of components are views (sharing the memory)
+# of its consecutive pieces. The view knows its owner and offset.
+#
+# NOTE: a write through a view (owner) does not increase the state of the
+# owner (views) and PETSc keeps e.g. norms by the state. ii_Function thus
+# increases the states of all of them whenever some is handed out.
+VIEW_ATTR = '__xii_view__'
+
+
+def contiguous_vecs(sizes):
+    '''Vec of size sum(sizes) and its views with sizes'''
+    offsets = np.cumsum([0] + list(sizes))
+    # Vecs created with array use its memory; which is local so serial only
+    array = np.zeros(offsets[-1], dtype=PETSc.ScalarType)
+    owner = PETSc.Vec().createWithArray(array, comm=PETSc.COMM_SELF)
+
+    views = []
+    for first, last in zip(offsets[:-1], offsets[1:]):
+        view = PETSc.Vec().createWithArray(array[first:last], comm=PETSc.COMM_SELF)
+        view.setAttr(VIEW_ATTR, (owner, first))
+        views.append(view)
+    return owner, views
+
+
+def is_view(vec):
+    '''
+    Is the PETSc vec a view into contiguous storage? Note that then its
+    values can change without its state being increased.
+    '''
+    return vec.getAttr(VIEW_ATTR) is not None
+
+
+def contiguous_owner(bvec):
+    '''PETSc Vec whose views are (all and in order) the blocks of bvec or None'''
+    owner, offset = None, 0
+    for v in bvec:
+        try:
+            vec = as_backend_type(v).vec()
+        except (AttributeError, TypeError):
+            return None
+        
+        view = vec.getAttr(VIEW_ATTR)
+        if view is None:
+            return None
+
+        this_owner, this_offset = view
+        if owner is None:
+            owner = this_owner
+        # Views of owner must follow each other
+        if this_owner.handle != owner.handle or this_offset != offset:
+            return None
+        offset += vec.getSize()
+    # And cover it
+    if owner is None or offset != owner.getSize():
+        return None
+    return owner
+
+
 class ii_Function(object):
-    '''Really a list of functions where each is in some W[i]'''
-    def __init__(self, W, components=None):
-        if components is None:
+    '''
+    Really a list of functions where each is in some W[i]. If contiguous
+    the coefficients of all the functions are stored in one vector.
+    '''
+    def __init__(self, W, components=None, contiguous=False):
+        self._vec, self._nest = None, None
+
+        if contiguous:
+            self._vec, self._views = contiguous_vecs([Wi.dim() for Wi in W])
+            self.functions = [Function(Wi, PETScVector(view)) for Wi, view in zip(W, self._views)]
+            # Values are copied in
+            if components is not None:
+                assert len(components) == len(W)
+                for f, c in zip(self.functions, components):
+                    if hasattr(c, 'function_space'):
+                        c = c.vector()
+                    assert c.size() == f.vector().size()
+                    f.vector().set_local(c.get_local())
+                    f.vector().apply('insert')
+        elif components is None:
             self.functions = map(Function, W)
         else:
             assert len(components) == len(W)
@@ -37,8 +114,15 @@ class ii_Function(object):
     def function_space(self):
         return self._W
 
+    def touch(self):
+        '''Values of contiguous storage are about to be read/written'''
+        if self._vec is not None:
+            for vec in [self._vec] + self._views:
+                vec.stateIncrease()
+
     def vectors(self):
         '''Coefficient vectors of the functions I hold'''
+        self.touch()
         return [f.vector() for f in self.functions]
 
     def vector(self):
@@ -50,8 +134,17 @@ class ii_Function(object):
         return PETScVector(self.petsc_vec())
 
     def petsc_vec(self):
-        '''PETSc Vec (not dolfin.PETSc!)'''
-        return as_petsc_nest(self.block_vec())
+        '''
+        PETSc Vec (not dolfin.PETSc!). Monolithic for contiguous function,
+        nested otherwise.
+        '''
+        if self._vec is not None:
+            self.touch()
+            return self._vec
+        # Components do not change so neither does the nest of them
+        if self._nest is None:
+            self._nest = as_petsc_nest(self.block_vec())
+        return self._nest
         
     def block_vec(self):
         '''A block vec that is the coefficients of the function'''
@@ -62,6 +155,7 @@ class ii_Function(object):
     def __getitem__(self, i):
         '''Get the function in the ith subspace'''
         assert 0 <= i < len(self), (i, len(self))
+        self.touch()
         return self.functions[i]
 
     def __iter__(self):
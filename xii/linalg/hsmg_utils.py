@@ -1,24 +1,140 @@
 from hsmg.hseig import InterpolationMatrix
 from block.block_compose import block_mul, block_add, block_sub
+from block.block_base import block_base
 
-from xii.linalg.matrix_utils import is_petsc_mat, is_number
+from xii.linalg.matrix_utils import is_number, as_petsc
 from xii.linalg.convert import numpy_to_petsc
 from xii.linalg import block_utils
 
+from dolfin import Vector, mpi_comm_world
 from scipy.linalg import eigh
 import numpy as np
+from collections import OrderedDict
+import threading
+import hashlib
+import os
 
 
-def inverse(bmat):
+# The generalized eigenpairs (A, M) cost O(n^3) and preconditioners in 
+# sweeps over alpha_j, s_j need the same ones over and over. They are 
+# kept by the digest of the values of A, M in memory and optionally
+# (cache_dir) on disk as npz files. Being dense only the MAX_EIGENPAIRS most
+# recently used stay in memory.
+MAX_EIGENPAIRS = 4
+
+_eigenpairs = OrderedDict()
+_lock = threading.Lock()
+
+
+def default_cache_dir():
+    '''Eigenpairs on disk'''
+    return os.path.join(os.environ.get('XII_CACHE_DIR',
+                                       os.path.join(os.path.expanduser('~'), '.cache', 'xii')),
+                        'eigh')
+
+
+def matrix_digest(*mats):
+    '''Hash of the values of matrices'''
+    digest = hashlib.md5()
+    for mat in mats:
+        mat = as_petsc(mat)
+        digest.update(str(mat.getSize()))
+        for array in mat.getValuesCSR():
+            digest.update(array.tostring())
+    return digest.hexdigest()
+
+
+def eigenpairs(A, M, cache_dir=None):
+    '''
+    Solution lmbda, U of A U = lmbda M U. With cache_dir (True for the 
+    default location) they are stored on/loaded from disk.
+    '''
+    key = matrix_digest(A, M)
+    with _lock:
+        if key in _eigenpairs:
+            # Now the most recent
+            _eigenpairs[key] = _eigenpairs.pop(key)
+            return _eigenpairs[key]
+
+    if cache_dir is True: cache_dir = default_cache_dir()
+    path = os.path.join(cache_dir, 'eigh_%s.npz' % key) if cache_dir else None
+
+    if path is not None and os.path.exists(path):
+        data = np.load(path)
+        lmbda, U = data['lmbda'], data['U']
+    else:
+        lmbda, U = eigh(A.array(), M.array())
+        if path is not None:
+            if not os.path.exists(cache_dir): os.makedirs(cache_dir)
+            # Readers never see partial file
+            tmp = '%s.%d' % (path, os.getpid())
+            with open(tmp, 'wb') as f:
+                np.savez(f, lmbda=lmbda, U=U)
+            os.rename(tmp, path)
+
+    with _lock:
+        _eigenpairs.pop(key, None)
+        _eigenpairs[key] = (lmbda, U)
+        while len(_eigenpairs) > MAX_EIGENPAIRS:
+            _eigenpairs.popitem(last=False)
+    return lmbda, U
+
+
+def clear():
+    '''Forget the eigenpairs (in memory)'''
+    with _lock:
+        _eigenpairs.clear()
+
+
+class SpectralOperator(block_base):
+    '''
+    U*diag(diagonal)*U^T applied in factored form, i.e. U^T*x, scaling,
+    U*(). The dense matrix is formed only if asked for (array, matrix).
+    '''
+    def __init__(self, U, diagonal):
+        self.U = U
+        self.diagonal = diagonal
+        self._matrix = None
+        # Handle get_dims
+        self.__sizes__ = U.shape
+
+    def matmat(self, X):
+        '''Action on the (n, k) array'''
+        return self.U.dot(self.diagonal[:, None]*self.U.T.dot(X))
+
+    def matvec(self, b):
+        x = self.create_vec()
+        x.set_local(self.matmat(b.get_local()[:, None]).ravel())
+        return x
+
+    transpmult = matvec
+
+    def create_vec(self, dim=1):
+        return Vector(mpi_comm_world(), self.U.shape[dim])
+
+    def array(self):
+        '''Dense matrix'''
+        return self.U.dot(self.diagonal[:, None]*self.U.T)
+
+    @property
+    def matrix(self):
+        '''As PETScMatrix (dense AIJ); built on first access'''
+        if self._matrix is None:
+            self._matrix = numpy_to_petsc(self.array())
+        return self._matrix
+
+
+def inverse(bmat, cache_dir=None):
     '''
     Inverse of a linear combination of Hs norms. We very strictly 
-    enforce the form of sum_j alpha_j H^{s_j}
+    enforce the form of sum_j alpha_j H^{s_j}. The eigenpairs are 
+    cached (see eigenpairs) and the inverse is applied in factored form.
     '''
     if isinstance(bmat, InterpolationMatrix):
         return bmat**-1
 
     if isinstance(bmat, block_utils.VectorizedOperator):
-        return block_utils.VectorizedOperator(inverse(bmat.bmat), bmat.W)
+        return block_utils.VectorizedOperator(inverse(bmat.bmat, cache_dir), bmat.W)
     
     # Does it satisfy the definittion
     assert is_well_defined(bmat)
@@ -27,7 +143,7 @@ def inverse(bmat):
     # Do it your self
     if U is None or lmbda is None:
         A, M = extract_attributes(bmat, ('A', 'M'))
-        lmbda, U = eigh(A.array(), M.array())
+        lmbda, U = eigenpairs(A, M, cache_dir)
 
     diagonal = np.zeros_like(lmbda)
     for alpha, s in collect(bmat):
@@ -35,9 +151,7 @@ def inverse(bmat):
     # Invert
     diagonal[:] = 1./diagonal
     
-    array = U.dot(np.diag(diagonal).dot(U.T))
-
-    return numpy_to_petsc(array)
+    return SpectralOperator(U, diagonal)
 
 
 def crawl(bmat):
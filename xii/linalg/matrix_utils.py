@@ -32,11 +32,48 @@ def as_petsc(A):
     raise ValueError('%r is not matrix/vector.' % type(A))
 
 
+# Reduction operators are memoized and shared by all the forms (blocks)
+# using them. Nobody modifies them so they are flagged (PETSc attribute) to
+# be passed around as they are, e.g. not copied by the form cache.
+REDUCTION_ATTR = '__xii_reduction__'
+
+
+def mark_reduction(T):
+    '''Flag T as a (shared) reduction operator'''
+    as_petsc(T).setAttr(REDUCTION_ATTR, True)
+    return T
+
+
+def is_reduction(T):
+    '''Is T a (shared) reduction operator'''
+    return is_petsc_mat(T) and as_petsc(T).getAttr(REDUCTION_ATTR) is not None
+
+
+# The transpose is remembered by the matrix (as PETSc attribute so it
+# goes away with it) together with the states of both. It is recomputed
+# when either of them changed.
+TRANSPOSE_ATTR = '__xii_transpose__'
+
+
 def transpose_matrix(A):
     '''Create a transpose of PETScMatrix/PETSc.Mat'''
     if isinstance(A, PETSc.Mat):
+        try:
+            state = A.stateGet()
+        except AttributeError:
+            state = None
+
+        cached = A.getAttr(TRANSPOSE_ATTR)
+        if state is not None and cached is not None:
+            A_state, At, At_state = cached
+            if A_state == state and At.stateGet() == At_state:
+                return At
+            
         At = PETSc.Mat()  # Alloc
         A.transpose(At)  # Transpose to At
+
+        if state is not None:
+            A.setAttr(TRANSPOSE_ATTR, (state, At, At.stateGet()))
         return At
 
     At = transpose_matrix(as_backend_type(A).mat())
@@ -0,0 +1,114 @@
+from xii.linalg.matrix_utils import is_petsc_mat, as_petsc
+from xii.linalg.convert import collapse
+from xii.profiling import phase, describe
+
+from block.block_compose import block_mul, block_transpose
+from dolfin import PETScMatrix
+from petsc4py import PETSc
+import numpy as np
+import threading
+
+
+# Reduced bilinear forms are T_test^T*A*T_trial where T are the reduction
+# operators. Here the product is computed eagerly with PETSc as a single
+# matrix. The products are remembered by key (which should identify the
+# sparsity of A) so that the next time the form is assembled only the
+# numeric phase runs (PETSc's MAT_REUSE_MATRIX) filling the old result.
+# Unless asked to reuse it callers get a copy of the result.
+#
+# NOTE: the operators are part of the key by their Mat handles and are kept
+# in the entry so that the handles are not reused.
+MAX_PRODUCTS = 256
+
+_products = {}
+_lock = threading.Lock()
+
+
+def split_reduced(A):
+    '''Break A into (Tl, A, Tr) where A = Tl^T*A*Tr, T* None if missing'''
+    Tl, Tr = None, None
+    if isinstance(A, block_mul):
+        chain = list(A.chain)
+        if len(chain) > 1 and isinstance(chain[0], block_transpose) and is_petsc_mat(chain[0].A):
+            Tl = chain.pop(0).A
+        if len(chain) > 1 and is_petsc_mat(chain[-1]):
+            Tr = chain.pop()
+        A = chain[0] if len(chain) == 1 else block_mul(chain)
+
+    if not is_petsc_mat(A):
+        A = collapse(A)
+    return Tl, A, Tr
+
+
+def sparsity(A):
+    '''CSR pattern (row pointers, column indices) of A'''
+    return as_petsc(A).getRowIJ()
+
+
+def same_sparsity(pattern, A):
+    '''Does A have the pattern'''
+    return all(np.array_equal(p, q) for p, q in zip(pattern, sparsity(A)))
+
+
+def product(Tl, A, Tr, C_, work):
+    '''
+    C_ = Tl^T*A*Tr where C_ and work are PETSc.Mat. If they are empty the
+    symbolic phase runs, otherwise C_ is refilled.
+    '''
+    A_ = as_petsc(A)
+    if Tl is not None and Tr is not None:
+        if Tl is Tr:
+            A_.PtAP(as_petsc(Tr), C_)
+        else:
+            A_.matMult(as_petsc(Tr), work)
+            as_petsc(Tl).transposeMatMult(work, C_)
+    elif Tl is not None:
+        as_petsc(Tl).transposeMatMult(A_, C_)
+    else:
+        A_.matMult(as_petsc(Tr), C_)
+    return C_
+
+
+def reduced_product(Tl, A, Tr, key, reuse=False):
+    '''
+    Tl^T*A*Tr as PETScMatrix. Tl/Tr can be None meaning identity. Tl is Tr
+    is done by PtAP. With reuse the result is the matrix remembered for key
+    and will be overwritten by the next product with the key.
+    '''
+    # A might come in with its own reductions
+    Tl_A, A, Tr_A = split_reduced(A)
+    assert Tl is None or Tl_A is None
+    assert Tr is None or Tr_A is None
+    Tl = Tl if Tl is not None else Tl_A
+    Tr = Tr if Tr is not None else Tr_A
+
+    if Tl is None and Tr is None:
+        return A
+
+    A_ = as_petsc(A)
+    handle = lambda T: None if T is None else as_petsc(T).handle
+    key = (key, handle(Tl), handle(Tr), A_.size)
+
+    with _lock, phase('ptap'):
+        # Symbolic phase is reused only with the same sparsity of A
+        if key in _products and not same_sparsity(_products[key][0], A):
+            del _products[key]
+        if key not in _products:
+            # Products of forms built over and over would pile up
+            if len(_products) >= MAX_PRODUCTS:
+                _products.clear()
+            _products[key] = (sparsity(A), PETSc.Mat(), PETSc.Mat(), (Tl, Tr))
+        _, C_, work, _ = _products[key]
+        product(Tl, A_, Tr, C_, work)
+
+        if not reuse:
+            C_ = C_.copy()
+
+    describe('ptap', C_)
+    return PETScMatrix(C_)
+
+
+def clear():
+    '''Forget the products'''
+    with _lock:
+        _products.clear()
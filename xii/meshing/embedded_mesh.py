@@ -1,4 +1,5 @@
 from make_mesh_cpp import make_mesh
+from xii.profiling import traced
 from collections import defaultdict
 from itertools import chain
 import dolfin as df
@@ -13,6 +14,8 @@ class EmbeddedMesh(df.Mesh):
     mesh vertices to the old ones, and new mesh cells to the old mesh entities.
     Having several maps in the dict is useful for mortating.
     '''
+    @traced('EmbeddedMesh', lambda self, f, markers: {'parent_cells': f.mesh().num_cells(),
+                                                       'entity_dim': f.dim()})
     def __init__(self, marking_function, markers):
         if not isinstance(markers, (list, tuple)): markers = [markers]
         
@@ -206,6 +209,8 @@ def InnerNormal(mesh, orientation):
     return n
 
 
+@traced('build_embedding_map', lambda emesh, mesh, tol=None: {'cells': emesh.num_cells(),
+                                                              'parent_cells': mesh.num_cells()})
 def build_embedding_map(emesh, mesh, tol=1E-14):
     '''
     Operating with the assumption that the emsh consists of entities 
@@ -1,5 +1,8 @@
 from dolfin import compile_extension_module as compile_cpp
-from dolfin import Mesh, MeshEditor
+from dolfin import Mesh, MeshEditor, warning, __version__ as dolfin_version
+import numpy as np
+import hashlib
+import os
 
 code='''
 #include <dolfin/mesh/Mesh.h>
@@ -60,7 +63,54 @@ namespace dolfin {
   }
 };
 '''
-module = compile_cpp(code)
+# Compiled on first use (JIT takes seconds) and kept in a cache directory
+# which is specific to the code and dolfin version. Without compiler (or
+# with XII_NO_JIT set) the mesh is filled from python. NOTE: MeshEditor has
+# no bulk interface so that fallback adds the vertices and cells one by one
+# (python loop) and is much slower for large meshes.
+module = None
+
+
+def cache_dir():
+    '''Where the compiled module lives'''
+    root = os.environ.get('XII_CACHE_DIR',
+                          os.path.join(os.path.expanduser('~'), '.cache', 'xii'))
+    version = hashlib.md5(code + dolfin_version).hexdigest()[:12]
+    return os.path.join(root, 'make_mesh_%s' % version)
+
+
+def get_module():
+    '''The compiled fill_mesh or None if it is not available'''
+    global module
+    if module is None:
+        if os.environ.get('XII_NO_JIT'):
+            module = False
+        else:
+            try:
+                module = compile_cpp(code, cache_dir=cache_dir())
+            except (RuntimeError, OSError, IOError) as e:
+                warning('Compiling make_mesh failed (%s); using (slow) MeshEditor from python' % e)
+                module = False
+    return module or None
+
+
+def fill_mesh(coordinates, cells, tdim, gdim, mesh):
+    '''Python version of the compiled fill_mesh (slow, loops over entities)'''
+    coordinates = np.asarray(coordinates, dtype='double').reshape((-1, gdim))
+    cells = np.asarray(cells, dtype='uintp').reshape((-1, tdim+1))
+
+    editor = MeshEditor()
+    editor.open(mesh, {1: 'interval', 2: 'triangle', 3: 'tetrahedron'}[tdim], tdim, gdim)
+
+    editor.init_vertices(len(coordinates))
+    for index, vertex in enumerate(coordinates):
+        editor.add_vertex(index, vertex)
+
+    editor.init_cells(len(cells))
+    for index, cell in enumerate(cells):
+        editor.add_cell(index, cell)
+
+    editor.close()
 
 
 def make_mesh(coordinates, cells, tdim, gdim, mesh=None):
@@ -69,6 +119,10 @@ def make_mesh(coordinates, cells, tdim, gdim, mesh=None):
         mesh = Mesh()
         assert mesh.mpi_comm().size == 1
 
-    module.fill_mesh(coordinates.flatten(), cells.flatten(), tdim, gdim, mesh)
+    module = get_module()
+    if module is not None:
+        module.fill_mesh(coordinates.flatten(), cells.flatten(), tdim, gdim, mesh)
+    else:
+        fill_mesh(coordinates, cells, tdim, gdim, mesh)
     
     return mesh
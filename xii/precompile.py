@@ -0,0 +1,117 @@
+# The forms of a problem, the reduced forms derived from them by the
+# assemblers and the subdomains/expressions are compiled by FFC/dijitso/
+# instant when they are first seen. On a fresh node this can take minutes.
+# Here we set up the problem (on the coarsest case; compiled code does not
+# depend on the mesh size) and assemble it so that everything is compiled
+# into one cache directory. Shipping the directory and pointing the workers
+# to it with the same environment variables makes their JIT warm.
+#
+#   python -m xii precompile demo/babuska_2d.py --cache-dir /shared/jit
+#
+# A problem module is expected to follow the demos, i.e. define
+# setup_mms(eps) giving the rhs_data for its setup_problem(i, rhs_data, eps).
+# Modules which do not are skipped.
+import argparse
+import os
+import sys
+
+
+# Variable -> subdirectory of the cache
+CACHES = (('DIJITSO_CACHE_DIR', 'dijitso'),  # FFC forms, expressions, subdomains
+          ('INSTANT_CACHE_DIR', 'instant'),  # compile_extension_module
+          ('XII_CACHE_DIR', 'xii'))          # make_mesh
+
+
+def cache_environment(root):
+    '''Environment variables making the JIT caches live in root'''
+    root = os.path.abspath(root)
+    return dict((var, os.path.join(root, sub)) for var, sub in CACHES)
+
+
+def load_problem(name):
+    '''Import problem module by name or from path to the file'''
+    if name.endswith('.py'):
+        directory, name = os.path.split(os.path.abspath(name))
+        sys.path.insert(0, directory)
+        name = name[:-len('.py')]
+    return __import__(name)  # no importlib in python2.7
+
+
+def precompile(module, cases=(0, ), eps=1.):
+    '''
+    Compile the forms (and what they need) of problem module. Returns the
+    number of compiled cases (None if the module was skipped); errors are
+    reported and the remaining cases are tried.
+    '''
+    from xii.meshing.make_mesh_cpp import get_module
+    from xii import ii_assemble
+
+    # EmbeddedMesh (without compiler we fall back to python)
+    get_module()
+
+    if not all(hasattr(module, f) for f in ('setup_mms', 'setup_problem')):
+        print 'Skipping %s (no setup_mms/setup_problem)' % module.__name__
+        return None
+
+    try:
+        rhs_data = module.setup_mms(eps)
+    except Exception as e:
+        print 'Skipping %s (setup_mms failed: %r)' % (module.__name__, e)
+        return None
+
+    count = 0
+    for i in cases:
+        try:
+            # Subdomains for EmbeddedMesh are compiled here
+            a, L, W = module.setup_problem(i, rhs_data, eps=eps)
+            # With the reduced forms here
+            ii_assemble(a)
+            ii_assemble(L)
+        except Exception as e:
+            print 'Case %d of %s failed: %r' % (i, module.__name__, e)
+            continue
+        count += 1
+    return count
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m xii precompile',
+                                     description='Fill JIT caches with compiled forms of a problem')
+    parser.add_argument('problems', type=str, nargs='+',
+                        help='Modules (or paths to them) with setup_mms(eps) and setup_problem(i, rhs_data, eps)')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Root of the cache directories (default are the usual caches)')
+    parser.add_argument('--cases', type=int, nargs='+', default=[0],
+                        help='Refinement levels i passed to setup_problem')
+    parser.add_argument('--eps', type=float, default=1.,
+                        help='Parameter of setup_mms/setup_problem')
+    args = parser.parse_args(argv)
+
+    if args.cache_dir is not None:
+        env = cache_environment(args.cache_dir)
+        # The caches are configured when dolfin is imported (which has
+        # happened by now) so we start over in the right environment
+        if any(os.environ.get(var) != value for var, value in env.items()):
+            env = dict(os.environ, **env)
+            os.execve(sys.executable,
+                      [sys.executable, '-m', 'xii', 'precompile'] + argv,
+                      env)
+
+    failed = False
+    for problem in args.problems:
+        try:
+            count = precompile(load_problem(problem), args.cases, args.eps)
+        except Exception as e:
+            print 'Loading %s failed: %r' % (problem, e)
+            failed = True
+            continue
+        if count is None: continue
+
+        print 'Compiled %d case(s) of %s' % (count, problem)
+        failed = failed or count < len(args.cases)
+
+    if args.cache_dir is not None:
+        print 'Workers should set'
+        for var, value in sorted(cache_environment(args.cache_dir).items()):
+            print '\t%s=%s' % (var, value)
+    return int(failed)
@@ -0,0 +1,269 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+import threading
+import json
+import time
+import os
+
+
+# Where does the time go in assembling a system with many coupling blocks?
+# Code of xii marks its phases (with phase('name'): ...) and reports on
+# what it did (count). The phases nest (per thread) so the report is keyed
+# by the path, e.g. 'block (0, 1)/trace/reduction operator/basis evaluation'.
+# Each record has number of calls and time (inclusive of nested phases)
+# and the counters reported within the phase, e.g. nnz, bytes, hits/misses.
+#
+# The phases (and extra spans which are not part of the profile) can also
+# be written out as a timeline; Chrome trace-event JSON which Perfetto or
+# chrome://tracing load. Spans carry attributes, e.g. sizes of meshes, nnz.
+#
+# By default the profiling and tracing is off and then phase/count return 
+# immediately.
+_enabled = False
+_records = defaultdict(lambda: defaultdict(float))
+_lock = threading.Lock()
+_local = threading.local()
+
+_events = None
+_t0 = 0.
+
+
+def enable(flag=True):
+    '''Turn profiling on/off'''
+    global _enabled
+    _enabled = flag
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    '''Forget the recorded phases'''
+    with _lock:
+        _records.clear()
+
+
+def stack():
+    '''Names of the active phases of the thread'''
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+class NoPhase(object):
+    '''Disabled profiling'''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def describe(self, tensor):
+        pass
+
+NO_PHASE = NoPhase()
+
+
+class Phase(object):
+    '''
+    Time the code in with block. Record means that it is a phase of the
+    profile; otherwise it is only a span of the trace.
+    '''
+    def __init__(self, name, attributes, record=True, trace=True):
+        self.name = name
+        self.attributes = attributes
+        self.record = record
+        self.trace = trace
+
+    def __enter__(self):
+        if self.record:
+            phases = stack()
+            phases.append(self.name)
+            self.path = '/'.join(phases)
+        self.t0 = time.time()
+        return self
+
+    def __exit__(self, *args):
+        t1 = time.time()
+        dt = t1 - self.t0
+        if self.record:
+            stack().pop()
+            if _enabled:
+                with _lock:
+                    record = _records[self.path]
+                    record['calls'] += 1
+                    record['time'] += dt
+        # Snapshot in case tracing stops in other thread
+        events = _events
+        if events is not None and self.trace:
+            events.append({'name': self.name,
+                           'ph': 'X',
+                           'ts': 1E6*(self.t0 - _t0),
+                           'dur': 1E6*dt,
+                           'pid': os.getpid(),
+                           'tid': threading.current_thread().ident,
+                           'args': self.attributes})
+        return False
+
+    def set(self, **attributes):
+        '''Attributes of the span learned in the with block'''
+        self.attributes.update(attributes)
+
+    def describe(self, tensor):
+        '''Size of tensor made in the span as its attributes'''
+        self.attributes.update(tensor_stats(tensor))
+
+
+def is_active():
+    return _enabled or _events is not None
+
+
+def phase(name, **attributes):
+    '''Context manager for recording the phase'''
+    return Phase(name, attributes) if (_enabled or _events is not None) else NO_PHASE
+
+
+def step(name):
+    '''
+    Phase which is repeated many times in a loop. It is profiled but not
+    traced as the timeline would drown in it.
+    '''
+    return Phase(name, None, trace=False) if _enabled else NO_PHASE
+
+
+def span(name, **attributes):
+    '''Context manager for a span of the trace; it is not in the profile'''
+    return Phase(name, attributes, record=False) if _events is not None else NO_PHASE
+
+
+def profiled(name):
+    '''Decorated function is a phase; recursive calls are not nested'''
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not is_active() or stack()[-1:] == [name]:
+                return f(*args, **kwargs)
+            with Phase(name, {}):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced(name, attributes=None):
+    '''
+    Decorated function is a span. Attributes(*args, **kwargs) of the
+    function call give attributes of the span.
+    '''
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if _events is None:
+                return f(*args, **kwargs)
+            
+            attrs = attributes(*args, **kwargs) if attributes is not None else {}
+            with Phase(name, attrs, record=False):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name=None, **counters):
+    '''Add counters to the (sub)phase name of the current phase'''
+    if not _enabled: return
+
+    path = '/'.join(stack() + ([name] if name is not None else []))
+    with _lock:
+        record = _records[path]
+        for key, value in counters.items():
+            record[key] += value
+
+
+def tensor_stats(tensor):
+    '''Counters for assembled/reduction matrices and vectors'''
+    from xii.linalg.matrix_utils import as_petsc
+    from petsc4py import PETSc
+
+    if not isinstance(tensor, (PETSc.Mat, PETSc.Vec)):
+        try:
+            tensor = as_petsc(tensor)
+        except ValueError:
+            # Numbers, cbc.block expressions
+            return {}
+
+    if isinstance(tensor, PETSc.Mat):
+        try:
+            info = tensor.getInfo()
+        except PETSc.Error:
+            return {}
+        return {'nnz': info['nz_used'], 'bytes': info['memory']}
+
+    if isinstance(tensor, PETSc.Vec):
+        return {'size': tensor.getSize(), 'bytes': 8*tensor.getLocalSize()}
+    return {}
+
+
+def describe(name, tensor):
+    '''Record size of the tensor computed in (sub)phase name'''
+    if not _enabled: return
+
+    count(name, **tensor_stats(tensor))
+
+
+def cache_access(name, hit, tensor=None):
+    '''Record hit/miss of a cache; on miss the tensor is described'''
+    if not _enabled: return
+
+    if hit:
+        count(name, hits=1)
+    else:
+        count(name, misses=1)
+        if tensor is not None: describe(name, tensor)
+
+
+def profile(as_json=False):
+    '''
+    Report as {phase path: {'calls': n, 'time': seconds, counters...}}
+    (or its JSON representation).
+    '''
+    with _lock:
+        report = {path: dict(record) for path, record in _records.items()}
+
+    return json.dumps(report, indent=2, sort_keys=True) if as_json else report
+
+
+def start_tracing():
+    '''Begin collecting spans'''
+    global _events, _t0
+    _t0 = time.time()
+    _events = []
+
+
+def stop_tracing(path=None):
+    '''Stop collecting spans and return them; written to path if given'''
+    global _events
+    events, _events = _events, None
+
+    if events is None:
+        events = []
+
+    if path is not None:
+        with open(path, 'w') as out:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, out)
+    return events
+
+
+@contextmanager
+def tracing(path):
+    '''Spans in the with block are saved to path as Chrome trace'''
+    start_tracing()
+    try:
+        yield
+    finally:
+        stop_tracing(path)